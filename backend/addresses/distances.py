@@ -0,0 +1,55 @@
+import geopy.distance
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Haversine is off from geodesic by up to ~0.5%, so destinations within
+# this margin of the nearest one are recalculated precisely.
+CLOSE_CALL_MARGIN = 0.01
+
+
+def to_radians(coordinates):
+    coordinates = np.array(coordinates, dtype=float).reshape(-1, 2)
+    return np.radians(coordinates[:, 0]), np.radians(coordinates[:, 1])
+
+
+def distance_matrix(origins, destinations, precise=False):
+    """Расстояния в км от каждой точки origins до каждой точки destinations.
+
+    Точки задаются парами (широта, долгота), для неизвестных координат
+    в матрице будет nan.
+    """
+    origins_lat, origins_lon = to_radians(origins)
+    destinations_lat, destinations_lon = to_radians(destinations)
+
+    origins_lat = origins_lat[:, np.newaxis]
+    origins_lon = origins_lon[:, np.newaxis]
+
+    haversine = (
+        np.sin((destinations_lat - origins_lat) / 2) ** 2
+        + np.cos(origins_lat) * np.cos(destinations_lat)
+        * np.sin((destinations_lon - origins_lon) / 2) ** 2
+    )
+    distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(haversine))
+
+    if precise and distances.size:
+        refine_close_calls(distances, origins, destinations)
+
+    return distances
+
+
+def refine_close_calls(distances, origins, destinations):
+    known = ~np.isnan(distances)
+    nearest = np.nanmin(
+        np.where(known, distances, np.inf),
+        axis=1,
+        keepdims=True
+    )
+    close_calls = known & (distances <= nearest * (1 + CLOSE_CALL_MARGIN))
+
+    for origin_index, destination_index in zip(*np.nonzero(close_calls)):
+        distances[origin_index, destination_index] = geopy.distance.distance(
+            origins[origin_index],
+            destinations[destination_index]
+        ).km
@@ -0,0 +1,368 @@
+import csv
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.utils.http import parse_http_date_safe
+from django.utils.module_loading import import_string
+
+from star_burger.metrics import GEOCODER_REJECTED, GEOCODER_REQUESTS
+
+from .normalization import normalize_address
+
+
+class GeocoderUnavailable(requests.RequestException):
+    pass
+
+
+class MalformedResponse(requests.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    """Перестаёт обращаться к геокодеру после нескольких ошибок подряд.
+
+    Через GEOCODER_BREAKER_RESET секунд пропускает один пробный запрос:
+    если он удался, геокодер снова доступен.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_until = 0
+        self.reason = None
+        self.probing = False
+
+    def is_open(self):
+        return time.monotonic() < self.opened_until
+
+    def before_call(self):
+        with self.lock:
+            if self.is_open():
+                raise GeocoderUnavailable(self.reason)
+            if self.failures >= settings.GEOCODER_BREAKER_FAILURES:
+                if self.probing:
+                    raise GeocoderUnavailable(self.reason)
+                self.probing = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.failures >= settings.GEOCODER_BREAKER_FAILURES:
+                self.open(settings.GEOCODER_BREAKER_RESET, 'breaker_open')
+
+    def record_rate_limit(self, retry_after):
+        with self.lock:
+            self.probing = False
+            self.open(retry_after, 'rate_limited')
+
+    def close(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_until = 0
+            self.probing = False
+
+    def open(self, seconds, reason):
+        self.opened_until = max(
+            self.opened_until,
+            time.monotonic() + seconds
+        )
+        self.reason = reason
+
+
+def get_retry_after(response):
+    value = response.headers.get('Retry-After', '')
+    if value.isdigit():
+        return int(value)
+
+    retry_at = parse_http_date_safe(value)
+    if retry_at is None:
+        return settings.GEOCODER_BREAKER_RESET
+    return max(retry_at - time.time(), 0)
+
+
+class HTTPGeocoder:
+    name = None
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+
+    def is_available(self):
+        return not self.breaker.is_open()
+
+    def fetch_coordinates(self, address, session):
+        try:
+            self.breaker.before_call()
+        except GeocoderUnavailable as error:
+            GEOCODER_REJECTED.labels(self.name, str(error)).inc()
+            raise
+
+        started_at = time.perf_counter()
+        result = 'error'
+        try:
+            coordinates = self.request_coordinates(address, session)
+            result = 'found'
+            self.breaker.record_success()
+            return coordinates
+        except GeocoderUnavailable:
+            result = 'rate_limited'
+            raise
+        except requests.RequestException:
+            # Includes malformed JSON, which is a ValueError as well
+            self.breaker.record_failure()
+            raise
+        except ValueError:
+            result = 'not_found'
+            self.breaker.record_success()
+            raise
+        finally:
+            GEOCODER_REQUESTS.labels(self.name, result).observe(
+                time.perf_counter() - started_at
+            )
+
+    def get_json(self, session, url, params, headers=None):
+        response = session.get(url, params=params, headers=headers, timeout=(
+            settings.GEOCODER_CONNECT_TIMEOUT,
+            settings.GEOCODER_READ_TIMEOUT
+        ))
+
+        if response.status_code == 429:
+            self.breaker.record_rate_limit(get_retry_after(response))
+            raise GeocoderUnavailable('rate_limited', response=response)
+
+        response.raise_for_status()
+        return response.json()
+
+    def request_coordinates(self, address, session):
+        found_places = self.request_places(address, session)
+        try:
+            coordinates = self.parse_coordinates(found_places)
+        except (
+            AttributeError,
+            IndexError,
+            KeyError,
+            TypeError,
+            ValueError
+        ) as error:
+            raise MalformedResponse(
+                f'Unexpected {self.name} response: {error!r}'
+            ) from error
+
+        if coordinates is None:
+            raise ValueError(f'Bad address "{address}"')
+        return coordinates
+
+    def request_places(self, address, session):
+        raise NotImplementedError
+
+    def parse_coordinates(self, found_places):
+        """Координаты самого подходящего места или None, если ничего нет."""
+        raise NotImplementedError
+
+
+class YandexGeocoder(HTTPGeocoder):
+    name = 'yandex'
+
+    def request_places(self, address, session):
+        return self.get_json(session, settings.GEOCODER_URL, {
+            "geocode": address,
+            "apikey": settings.YANDEX_GEOCODER_API_KEY,
+            "format": "json",
+        })
+
+    def parse_coordinates(self, found_places):
+        found_places = (
+            found_places['response']['GeoObjectCollection']['featureMember']
+        )
+        if not found_places:
+            return None
+
+        most_relevant = found_places[0]
+        longitude, latitude = (
+            most_relevant['GeoObject']['Point']['pos'].split(" ")
+        )
+
+        return float(longitude), float(latitude)
+
+
+class NominatimGeocoder(HTTPGeocoder):
+    name = 'nominatim'
+
+    def request_places(self, address, session):
+        return self.get_json(
+            session,
+            f'{settings.NOMINATIM_URL.rstrip("/")}/search',
+            {'q': address, 'format': 'jsonv2', 'limit': 1},
+            # The public Nominatim instance rejects requests without it
+            headers={'User-Agent': settings.NOMINATIM_USER_AGENT}
+        )
+
+    def parse_coordinates(self, found_places):
+        if not found_places:
+            return None
+
+        most_relevant = found_places[0]
+        return float(most_relevant['lon']), float(most_relevant['lat'])
+
+
+def get_trigrams(key):
+    padded = f'  {key} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def read_gazetteer(path):
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as gazetteer_file:
+            for row in csv.DictReader(gazetteer_file):
+                yield row['address'], row['longitude'], row['latitude']
+        return
+
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        yield from connection.execute(
+            'SELECT address, longitude, latitude FROM gazetteer'
+        )
+    finally:
+        connection.close()
+
+
+class GazetteerGeocoder:
+    """Офлайн-справочник адресов из CSV или SQLite-файла GEOCODER_GAZETTEER.
+
+    В CSV нужны колонки address, longitude и latitude, в SQLite — таблица
+    gazetteer с такими же колонками. Адрес ищется сначала точно, по
+    normalize_address, а потом по похожести триграмм. Номера домов при этом
+    должны совпадать.
+    """
+
+    name = 'gazetteer'
+
+    def __init__(self, path=None):
+        self.keys = []
+        self.coordinates = []
+        self.trigrams = []
+        self.numbers = []
+        self.keys_index = {}
+        self.trigrams_index = defaultdict(list)
+
+        for address, longitude, latitude in read_gazetteer(
+            path or settings.GEOCODER_GAZETTEER
+        ):
+            key = normalize_address(address)
+            if not key or key in self.keys_index:
+                continue
+
+            entry = len(self.keys)
+            self.keys.append(key)
+            self.coordinates.append((float(longitude), float(latitude)))
+            self.trigrams.append(get_trigrams(key))
+            self.numbers.append(re.findall(r'\d+', key))
+            self.keys_index[key] = entry
+            for trigram in self.trigrams[entry]:
+                self.trigrams_index[trigram].append(entry)
+
+    def is_available(self):
+        return True
+
+    def fetch_coordinates(self, address, session=None):
+        started_at = time.perf_counter()
+        entry = self.find(normalize_address(address))
+        GEOCODER_REQUESTS.labels(
+            self.name,
+            'not_found' if entry is None else 'found'
+        ).observe(time.perf_counter() - started_at)
+
+        if entry is None:
+            raise ValueError(f'Address "{address}" is not in the gazetteer')
+        return self.coordinates[entry]
+
+    def find(self, key):
+        if key in self.keys_index:
+            return self.keys_index[key]
+
+        trigrams = get_trigrams(key)
+        min_similarity = settings.GEOCODER_GAZETTEER_MIN_SIMILARITY
+        min_common = math.ceil(min_similarity * len(trigrams))
+
+        # A similar enough entry shares at least min_common trigrams, so
+        # it has one of any len(trigrams) - min_common + 1 of them:
+        # taking the rarest keeps the candidates list short
+        rarest_trigrams = sorted(
+            trigrams,
+            key=lambda trigram: len(self.trigrams_index.get(trigram, ()))
+        )[:len(trigrams) - min_common + 1]
+        candidates = {
+            entry
+            for trigram in rarest_trigrams
+            for entry in self.trigrams_index.get(trigram, ())
+        }
+
+        numbers = re.findall(r'\d+', key)
+        similarities = Counter({
+            entry: self.get_similarity(trigrams, entry)
+            for entry in candidates
+            if self.numbers[entry] == numbers
+        })
+        if not similarities:
+            return None
+
+        entry, similarity = similarities.most_common(1)[0]
+        return entry if similarity >= min_similarity else None
+
+    def get_similarity(self, trigrams, entry):
+        common = len(trigrams & self.trigrams[entry])
+        return common / (len(trigrams) + len(self.trigrams[entry]) - common)
+
+
+@lru_cache(maxsize=None)
+def get_geocoders():
+    return [import_string(path)() for path in settings.GEOCODER_BACKENDS]
+
+
+def is_available():
+    return any(geocoder.is_available() for geocoder in get_geocoders())
+
+
+def has_outage():
+    return not all(geocoder.is_available() for geocoder in get_geocoders())
+
+
+def fetch_coordinates(address, session=requests):
+    """Спрашивает геокодеры по очереди, пока один из них не найдёт адрес.
+
+    Если адрес никто не нашёл, бросает ValueError, а если хоть один
+    геокодер не ответил — его ошибку, чтобы адрес проверили ещё раз.
+    """
+    error = None
+    for geocoder in get_geocoders():
+        try:
+            return geocoder.fetch_coordinates(address, session)
+        except requests.RequestException as request_error:
+            error = request_error
+        except ValueError as not_found:
+            error = error or not_found
+
+    raise error
+
+
+def make_session(pool_size):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
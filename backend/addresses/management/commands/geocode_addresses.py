@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from prometheus_client import start_http_server
+
+from addresses.services import (
+    enqueue_expired_addresses,
+    process_geocoding_queue
+)
+
+
+class Command(BaseCommand):
+    help = 'Геокодирует адреса из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='сколько адресов забирать из очереди за раз'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='сколько секунд ждать, если очередь пуста'
+        )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            default=settings.GEOCODER_METRICS_PORT,
+            help='порт, на котором отдавать метрики геокодера для Prometheus'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='обработать очередь и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        # Geocoding happens only in this process, so the backend /metrics
+        # never sees these metrics
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'])
+
+        while True:
+            enqueue_expired_addresses(options['batch_size'])
+
+            processed = process_geocoding_queue(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Обработано адресов: {processed}')
+                continue
+
+            if options['once']:
+                return
+
+            time.sleep(options['poll_interval'])
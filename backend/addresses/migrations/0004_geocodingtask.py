@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 17:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addresses', '0003_alter_address_coordinates_update_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodingTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=200, unique=True, verbose_name='адрес')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='когда поставлена')),
+                ('scheduled_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='когда выполнить')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='попыток')),
+            ],
+            options={
+                'verbose_name': 'задача геокодирования',
+                'verbose_name_plural': 'задачи геокодирования',
+            },
+        ),
+    ]
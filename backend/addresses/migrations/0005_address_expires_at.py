@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addresses', '0004_geocodingtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=None, null=True, verbose_name='когда обновить координаты'),
+        ),
+    ]
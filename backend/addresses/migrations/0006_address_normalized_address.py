@@ -0,0 +1,98 @@
+import re
+
+from django.db import migrations, models
+
+
+# A frozen copy of addresses.normalization as of this migration, so that
+# later changes to the rules don't change what the migration writes
+MAX_LENGTH = 400
+
+ABBREVIATIONS = {
+    'ул': 'улица',
+    'пр': 'проспект',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'бульв': 'бульвар',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'туп': 'тупик',
+    'пр-д': 'проезд',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'мкр-н': 'микрорайон',
+    'р-н': 'район',
+    'обл': 'область',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+SKIPPED_WORDS = {'г', 'гор', 'город', 'д', 'дом'}
+
+WORD_PATTERN = re.compile(r'\w+(?:-\w+)*')
+BUILDING_PATTERN = re.compile(r'(?<=\d)(к|корп|стр)(?=\d)')
+
+
+def normalize_address(address):
+    address = address.casefold().replace('ё', 'е')
+    address = BUILDING_PATTERN.sub(r' \1 ', address)
+
+    words = []
+    for word in WORD_PATTERN.findall(address):
+        if word in SKIPPED_WORDS:
+            continue
+        words.append(ABBREVIATIONS.get(word, word))
+
+    return ' '.join(words)[:MAX_LENGTH]
+
+
+def normalize_addresses(apps, schema_editor):
+    Address = apps.get_model('addresses', 'Address')
+
+    kept_addresses = {}
+    duplicates = []
+    # Of the spellings of one address the freshest geocoded one is kept
+    for address in Address.objects.order_by(
+        models.F('coordinates_update_date').desc(nulls_last=True),
+        'id'
+    ).iterator():
+        normalized = normalize_address(address.address)
+        if normalized in kept_addresses:
+            duplicates.append(address.id)
+            continue
+        address.normalized_address = normalized
+        kept_addresses[normalized] = address
+
+    Address.objects.filter(id__in=duplicates).delete()
+    Address.objects.bulk_update(
+        kept_addresses.values(),
+        ['normalized_address'],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addresses', '0005_address_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='normalized_address',
+            field=models.CharField(max_length=400, null=True, verbose_name='нормализованный адрес'),
+        ),
+        migrations.RunPython(normalize_addresses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='address',
+            name='normalized_address',
+            field=models.CharField(help_text='по нему ищутся координаты, чтобы разные написания одного адреса геокодировались один раз', max_length=400, unique=True, verbose_name='нормализованный адрес'),
+        ),
+    ]
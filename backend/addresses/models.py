@@ -1,8 +1,23 @@
+import random
+from datetime import timedelta
+
 import requests
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from .geocoder import fetch_coordinates
+from .normalization import MAX_LENGTH as NORMALIZED_ADDRESS_MAX_LENGTH
+from .normalization import normalize_address
+
+
+class AddressQuerySet(models.QuerySet):
+    def expired(self):
+        return self.filter(
+            models.Q(expires_at__isnull=True)
+            | models.Q(expires_at__lte=timezone.now())
+        )
+
 
 class Address(models.Model):
     NULL_COORDINATES = (None, None)
@@ -13,6 +28,13 @@ class Address(models.Model):
         db_index=True,
         unique=True
     )
+    normalized_address = models.CharField(
+        max_length=NORMALIZED_ADDRESS_MAX_LENGTH,
+        verbose_name='нормализованный адрес',
+        unique=True,
+        help_text='по нему ищутся координаты, чтобы разные написания '
+                  'одного адреса геокодировались один раз'
+    )
 
     longitude = models.FloatField(
         verbose_name='долгота',
@@ -31,35 +53,77 @@ class Address(models.Model):
         default=None
     )
 
-    def update_coordinates(self, save=True):
-        address = self.address
+    expires_at = models.DateTimeField(
+        verbose_name='когда обновить координаты',
+        null=True,
+        default=None,
+        db_index=True
+    )
 
-        api_key = settings.YANDEX_GEOCODER_API_KEY
+    objects = AddressQuerySet.as_manager()
 
-        base_url = "https://geocode-maps.yandex.ru/1.x"
-        response = requests.get(base_url, params={
-            "geocode": address,
-            "apikey": api_key,
-            "format": "json",
-        })
-        response.raise_for_status()
-        found_places = (
-            response.json()['response']['GeoObjectCollection']['featureMember']
-        )
+    def save(self, *args, **kwargs):
+        if not self.normalized_address:
+            self.normalized_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
 
-        if not found_places:
-            raise ValueError(f'Bad address "{self.address}"')
+    def update_coordinates(self, save=True, session=requests):
+        try:
+            self.longitude, self.latitude = fetch_coordinates(
+                self.address,
+                session=session
+            )
+            ttl = settings.GEOCODER_COORDINATES_TTL
+        except requests.RequestException:
+            raise
+        except ValueError:
+            self.longitude, self.latitude = None, None
+            ttl = settings.GEOCODER_BAD_ADDRESS_TTL
 
-        most_relevant = found_places[0]
-        self.longitude, self.latitude = (
-            most_relevant['GeoObject']['Point']['pos'].split(" ")
-        )
+        jitter = random.uniform(1 - settings.GEOCODER_TTL_JITTER, 1)
 
         self.coordinates_update_date = timezone.now()
+        self.expires_at = (
+            self.coordinates_update_date + timedelta(seconds=ttl * jitter)
+        )
 
         if save:
             self.save()
 
+    def is_expired(self):
+        return self.expires_at is None or self.expires_at <= timezone.now()
+
     @property
     def coordinates(self):
         return self.latitude, self.longitude
+
+
+class GeocodingTask(models.Model):
+    address = models.CharField(
+        max_length=200,
+        verbose_name='адрес',
+        unique=True
+    )
+
+    created_at = models.DateTimeField(
+        verbose_name='когда поставлена',
+        default=timezone.now
+    )
+
+    scheduled_at = models.DateTimeField(
+        verbose_name='когда выполнить',
+        default=timezone.now,
+        db_index=True
+    )
+
+    attempts = models.PositiveIntegerField(
+        verbose_name='попыток',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'задача геокодирования'
+        verbose_name_plural = 'задачи геокодирования'
+
+    def __str__(self):
+        return self.address
@@ -0,0 +1,57 @@
+import re
+
+
+# Expanded abbreviations make the key up to about twice as long as
+# the 200 characters of the address itself
+MAX_LENGTH = 400
+
+ABBREVIATIONS = {
+    'ул': 'улица',
+    'пр': 'проспект',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'бульв': 'бульвар',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'туп': 'тупик',
+    'пр-д': 'проезд',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'мкр-н': 'микрорайон',
+    'р-н': 'район',
+    'обл': 'область',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+# Markers that are as often omitted as written: "г. Москва, д. 5"
+SKIPPED_WORDS = {'г', 'гор', 'город', 'д', 'дом'}
+
+WORD_PATTERN = re.compile(r'\w+(?:-\w+)*')
+# "5к2" and "5стр1" are house numbers with a building
+BUILDING_PATTERN = re.compile(r'(?<=\d)(к|корп|стр)(?=\d)')
+
+
+def normalize_address(address):
+    """Ключ адреса, одинаковый для разных написаний одного и того же адреса.
+
+    «г. Москва, ул. Ленина, д. 5» и «москва улица  Ленина 5» дают
+    «москва улица ленина 5».
+    """
+    address = address.casefold().replace('ё', 'е')
+    address = BUILDING_PATTERN.sub(r' \1 ', address)
+
+    words = []
+    for word in WORD_PATTERN.findall(address):
+        if word in SKIPPED_WORDS:
+            continue
+        words.append(ABBREVIATIONS.get(word, word))
+
+    return ' '.join(words)[:MAX_LENGTH]
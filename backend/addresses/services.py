@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from star_burger.metrics import record_cache_lookup
+
+from . import geocoder
+from .models import Address, GeocodingTask
+from .normalization import normalize_address
+
+
+def geocode_addresses(addresses):
+    if not addresses:
+        return []
+
+    workers = min(settings.GEOCODER_WORKERS, len(addresses))
+
+    def geocode(address):
+        try:
+            address.update_coordinates(save=False, session=session)
+        except requests.RequestException:
+            return None
+        return address
+
+    with geocoder.make_session(workers) as session:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            geocoded = executor.map(geocode, addresses)
+            return [address for address in geocoded if address]
+
+
+def get_normalized_addresses(addresses):
+    return {address: normalize_address(address) for address in addresses}
+
+
+def resolve_addresses(addresses):
+    normalized_addresses = get_normalized_addresses(addresses)
+    # Spellings of the same address are geocoded once, by the first of them
+    unique_addresses = {
+        normalized: address
+        for address, normalized in reversed(normalized_addresses.items())
+    }
+
+    existed_addresses = {
+        address.normalized_address: address
+        for address in Address.objects.filter(
+            normalized_address__in=unique_addresses
+        )
+    }
+
+    expired_addresses = [
+        address for address in existed_addresses.values()
+        if address.is_expired()
+    ]
+    addresses_to_create = [
+        Address(address=address, normalized_address=normalized)
+        for normalized, address in unique_addresses.items()
+        if normalized not in existed_addresses
+    ]
+
+    geocoded_addresses = geocode_addresses(
+        expired_addresses + addresses_to_create
+    )
+
+    Address.objects.bulk_update(
+        [address for address in geocoded_addresses if address.pk],
+        ['longitude', 'latitude', 'coordinates_update_date', 'expires_at']
+    )
+    created_addresses = Address.objects.bulk_create(
+        [address for address in geocoded_addresses if not address.pk],
+        ignore_conflicts=True
+    )
+
+    resolved_addresses = {
+        **existed_addresses,
+        **{address.normalized_address: address for address in created_addresses}
+    }
+    return {
+        address: resolved_addresses[normalized]
+        for address, normalized in normalized_addresses.items()
+        if normalized in resolved_addresses
+    }
+
+
+def get_cached_coordinates(addresses):
+    normalized_addresses = get_normalized_addresses(addresses)
+
+    known_addresses = list(Address.objects.filter(
+        normalized_address__in=set(normalized_addresses.values())
+    ))
+
+    fresh_addresses = {
+        address.normalized_address for address in known_addresses
+        if not address.is_expired()
+    }
+    enqueue_addresses(
+        address for address, normalized in normalized_addresses.items()
+        if normalized not in fresh_addresses
+    )
+
+    coordinates = {
+        address.normalized_address: address.coordinates
+        for address in known_addresses
+    }
+    hits = sum(
+        normalized in coordinates
+        for normalized in normalized_addresses.values()
+    )
+    record_cache_lookup('coordinates', True, hits)
+    record_cache_lookup('coordinates', False, len(normalized_addresses) - hits)
+
+    return {
+        address: coordinates[normalized]
+        for address, normalized in normalized_addresses.items()
+        if normalized in coordinates
+    }
+
+
+def enqueue_addresses(addresses):
+    # One task is enough for all spellings of an address
+    addresses = {
+        normalize_address(address): address for address in addresses
+    }
+    if not addresses:
+        return
+
+    GeocodingTask.objects.bulk_create(
+        [GeocodingTask(address=address) for address in addresses.values()],
+        ignore_conflicts=True
+    )
+
+
+def claim_geocoding_tasks(batch_size):
+    with transaction.atomic():
+        tasks = list(
+            GeocodingTask.objects
+            .select_for_update(skip_locked=True)
+            .filter(scheduled_at__lte=timezone.now())
+            .order_by('scheduled_at')[:batch_size]
+        )
+        # The attempt is counted up front, so a task that crashes the worker
+        # is given up after GEOCODER_MAX_ATTEMPTS like any other
+        (GeocodingTask.objects
+            .filter(pk__in=[task.pk for task in tasks])
+            .update(
+                attempts=F('attempts') + 1,
+                scheduled_at=timezone.now() + timedelta(
+                    seconds=settings.GEOCODER_TASK_LEASE
+                )
+            ))
+    return tasks
+
+
+def process_geocoding_queue(batch_size):
+    if not geocoder.is_available():
+        return 0
+
+    # Tasks are leased rather than locked for the whole batch, so the
+    # geocoder calls are made outside of a transaction
+    tasks = claim_geocoding_tasks(batch_size)
+    if not tasks:
+        return 0
+
+    addresses = resolve_addresses(task.address for task in tasks)
+
+    resolved_tasks = [
+        task.pk for task in tasks
+        if task.address in addresses
+        and not addresses[task.address].is_expired()
+        or task.attempts + 1 >= settings.GEOCODER_MAX_ATTEMPTS
+    ]
+
+    with transaction.atomic():
+        GeocodingTask.objects.filter(pk__in=resolved_tasks).delete()
+
+        # Addresses are not to blame for a geocoder outage, so its
+        # failures do not count towards GEOCODER_MAX_ATTEMPTS
+        attempts = F('attempts') - (1 if geocoder.has_outage() else 0)
+        (GeocodingTask.objects
+            .filter(pk__in=[task.pk for task in tasks])
+            .exclude(pk__in=resolved_tasks)
+            .update(
+                attempts=attempts,
+                scheduled_at=timezone.now() + timedelta(
+                    seconds=settings.GEOCODER_RETRY_DELAY
+                )
+            ))
+
+    return len(tasks)
+
+
+def enqueue_expired_addresses(limit):
+    enqueue_addresses(
+        Address.objects.expired()
+        .order_by('expires_at')
+        .values_list('address', flat=True)[:limit]
+    )
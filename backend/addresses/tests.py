@@ -1,3 +1,411 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from tempfile import TemporaryDirectory
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import geopy.distance
+import numpy as np
+import requests
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .distances import distance_matrix
+from .geocoder import (
+    GazetteerGeocoder,
+    GeocoderUnavailable,
+    fetch_coordinates,
+    get_geocoders,
+)
+from .models import Address, GeocodingTask
+from .normalization import normalize_address
+from .services import (
+    enqueue_addresses,
+    get_cached_coordinates,
+    process_geocoding_queue,
+    resolve_addresses
+)
+
+
+SLOW_ADDRESS = 'Медленная улица'
+RATE_LIMITED_ADDRESS = 'Слишком часто'
+MALFORMED_ADDRESS = 'Сломанный ответ'
+
+KNOWN_PLACES = {
+    'Москва, Красная площадь, 1': '37.620393 55.75396',
+    'Москва, Тверская, 1': '37.612236 55.757418',
+}
+
+
+class FakeGeocoderHandler(BaseHTTPRequestHandler):
+    requested = []
+
+    def do_GET(self):
+        address = parse_qs(urlparse(self.path).query)['geocode'][0]
+        self.requested.append(address)
+
+        if address == SLOW_ADDRESS:
+            # The client gives up before there is any answer
+            time.sleep(0.5)
+            return
+        if address == RATE_LIMITED_ADDRESS:
+            self.send_response(429)
+            self.send_header('Retry-After', '120')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        found = []
+        if address in KNOWN_PLACES:
+            found.append({'GeoObject': {'Point': {'pos': KNOWN_PLACES[address]}}})
+
+        body = json.dumps({
+            'response': {'GeoObjectCollection': {'featureMember': found}}
+        } if address != MALFORMED_ADDRESS else {'response': {}}).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ResolveAddressesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGeocoderHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address
+        cls.geocoder_settings = override_settings(
+            GEOCODER_URL=f'http://{host}:{port}/1.x'
+        )
+        cls.geocoder_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.geocoder_settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        FakeGeocoderHandler.requested = []
+        get_geocoders.cache_clear()
+        self.addCleanup(get_geocoders.cache_clear)
+
+    def test_resolves_unknown_addresses_once(self):
+        addresses = list(KNOWN_PLACES) * 3 + ['Нигде']
+
+        resolved = resolve_addresses(addresses)
+
+        self.assertEqual(
+            resolved['Москва, Тверская, 1'].coordinates,
+            (55.757418, 37.612236)
+        )
+        self.assertEqual(
+            resolved['Нигде'].coordinates,
+            Address.NULL_COORDINATES
+        )
+        self.assertCountEqual(
+            FakeGeocoderHandler.requested,
+            list(KNOWN_PLACES) + ['Нигде']
+        )
+
+    def test_fresh_addresses_are_not_geocoded(self):
+        Address.objects.create(
+            address='Москва, Тверская, 1',
+            latitude=1,
+            longitude=2,
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+
+        with self.assertNumQueries(2):
+            resolved = resolve_addresses(list(KNOWN_PLACES))
+
+        self.assertEqual(resolved['Москва, Тверская, 1'].coordinates, (1, 2))
+        self.assertEqual(
+            FakeGeocoderHandler.requested,
+            ['Москва, Красная площадь, 1']
+        )
+
+    def test_bad_addresses_are_cached(self):
+        resolve_addresses(['Нигде'])
+        resolve_addresses(['Нигде'])
+
+        self.assertEqual(FakeGeocoderHandler.requested, ['Нигде'])
+        self.assertEqual(
+            get_cached_coordinates(['Нигде']),
+            {'Нигде': Address.NULL_COORDINATES}
+        )
+        self.assertFalse(GeocodingTask.objects.exists())
+
+    def test_expired_addresses_are_refreshed(self):
+        Address.objects.create(
+            address='Москва, Тверская, 1',
+            latitude=1,
+            longitude=2,
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(
+            get_cached_coordinates(['Москва, Тверская, 1']),
+            {'Москва, Тверская, 1': (1, 2)}
+        )
+        self.assertEqual(process_geocoding_queue(batch_size=10), 1)
+
+        address = Address.objects.get()
+        self.assertEqual(address.coordinates, (55.757418, 37.612236))
+        self.assertFalse(address.is_expired())
+
+    def test_queue_resolves_addresses(self):
+        enqueue_addresses(list(KNOWN_PLACES) + ['Нигде'])
+
+        self.assertEqual(process_geocoding_queue(batch_size=10), 3)
+
+        self.assertEqual(Address.objects.count(), 3)
+        self.assertFalse(GeocodingTask.objects.exists())
+
+    def test_spellings_of_address_are_geocoded_once(self):
+        spellings = [
+            'Москва, Тверская, 1',
+            'г. Москва, Тверская, д. 1 ',
+            'москва  тверская 1',
+        ]
+
+        resolved = resolve_addresses(spellings)
+
+        self.assertEqual(FakeGeocoderHandler.requested, [spellings[0]])
+        self.assertEqual(Address.objects.get().address, spellings[0])
+        self.assertEqual(resolved.keys(), set(spellings))
+        self.assertEqual(len({id(address) for address in resolved.values()}), 1)
+        self.assertEqual(
+            get_cached_coordinates(['МОСКВА, ТВЕРСКАЯ, ДОМ 1']),
+            {'МОСКВА, ТВЕРСКАЯ, ДОМ 1': (55.757418, 37.612236)}
+        )
+        self.assertFalse(GeocodingTask.objects.exists())
+
+    @override_settings(GEOCODER_READ_TIMEOUT=0.1, GEOCODER_BREAKER_FAILURES=2)
+    def test_breaker_opens_after_failures(self):
+        for _ in range(2):
+            with self.assertRaises(requests.Timeout):
+                fetch_coordinates(SLOW_ADDRESS)
+
+        with self.assertRaises(GeocoderUnavailable):
+            fetch_coordinates('Москва, Тверская, 1')
+        self.assertEqual(FakeGeocoderHandler.requested, [SLOW_ADDRESS] * 2)
+
+        get_geocoders()[0].breaker.opened_until = 0
+        fetch_coordinates('Москва, Тверская, 1')
+        fetch_coordinates('Москва, Тверская, 1')
+
+    def test_crashed_batch_is_leased_and_counted(self):
+        enqueue_addresses(['Москва, Тверская, 1'])
+
+        with mock.patch(
+            'addresses.services.resolve_addresses',
+            side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                process_geocoding_queue(batch_size=10)
+
+        task = GeocodingTask.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.scheduled_at, timezone.now())
+        self.assertEqual(process_geocoding_queue(batch_size=10), 0)
+
+    def test_malformed_response_counts_as_attempt(self):
+        enqueue_addresses([MALFORMED_ADDRESS])
+
+        self.assertEqual(process_geocoding_queue(batch_size=10), 1)
+
+        task = GeocodingTask.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.scheduled_at, timezone.now())
+        self.assertFalse(Address.objects.exists())
+
+    def test_rate_limit_postpones_queue(self):
+        enqueue_addresses([RATE_LIMITED_ADDRESS])
+
+        self.assertEqual(process_geocoding_queue(batch_size=10), 1)
+        self.assertEqual(process_geocoding_queue(batch_size=10), 0)
+
+        self.assertTrue(get_geocoders()[0].breaker.is_open())
+        self.assertEqual(GeocodingTask.objects.get().attempts, 0)
+        self.assertEqual(
+            get_cached_coordinates([RATE_LIMITED_ADDRESS]),
+            {}
+        )
+
+    def test_gazetteer_is_asked_first(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'gazetteer.csv')
+            with open(path, 'w', newline='') as gazetteer_file:
+                writer = csv.writer(gazetteer_file)
+                writer.writerow(['address', 'longitude', 'latitude'])
+                writer.writerow(['Москва, Тверская, 1', '37.61', '55.75'])
+
+            with override_settings(
+                GEOCODER_GAZETTEER=path,
+                GEOCODER_BACKENDS=[
+                    'addresses.geocoder.GazetteerGeocoder',
+                    'addresses.geocoder.YandexGeocoder',
+                ]
+            ):
+                resolved = resolve_addresses(list(KNOWN_PLACES))
+
+        self.assertEqual(
+            resolved['Москва, Тверская, 1'].coordinates,
+            (55.75, 37.61)
+        )
+        self.assertEqual(
+            FakeGeocoderHandler.requested,
+            ['Москва, Красная площадь, 1']
+        )
+
+
+class GazetteerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'gazetteer.sqlite3')
+            with sqlite3.connect(path) as connection:
+                connection.execute(
+                    'CREATE TABLE gazetteer (address, longitude, latitude)'
+                )
+                connection.executemany(
+                    'INSERT INTO gazetteer VALUES (?, ?, ?)',
+                    [
+                        ('Москва, улица Тверская, 1', 37.61, 55.75),
+                        ('Москва, улица Тверская, 11', 37.60, 55.76),
+                        ('Москва, Красная площадь, 1', 37.62, 55.75),
+                    ]
+                )
+            connection.close()
+            cls.gazetteer = GazetteerGeocoder(path)
+
+    def test_exact_match_ignores_case_and_punctuation(self):
+        self.assertEqual(
+            self.gazetteer.fetch_coordinates('москва улица ТВЕРСКАЯ 11 '),
+            (37.60, 55.76)
+        )
+
+    def test_similar_address_needs_the_same_house_number(self):
+        self.assertEqual(
+            self.gazetteer.fetch_coordinates('Москва, улица Тверска, 1'),
+            (37.61, 55.75)
+        )
+        with self.assertRaises(ValueError):
+            self.gazetteer.fetch_coordinates('Москва, улица Тверская, 12')
+        with self.assertRaises(ValueError):
+            self.gazetteer.fetch_coordinates('Санкт-Петербург, Невский, 1')
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def test_spellings_have_the_same_key(self):
+        spellings = [
+            'ул. Ленина 5',
+            'улица Ленина, 5',
+            'Улица  Ленина, д. 5 ',
+            'ул.Ленина,5',
+        ]
+
+        self.assertEqual(
+            {normalize_address(spelling) for spelling in spellings},
+            {'улица ленина 5'}
+        )
+
+    def test_abbreviations(self):
+        self.assertEqual(
+            normalize_address('г. Санкт-Петербург, Невский пр-т, 28к2'),
+            'санкт-петербург невский проспект 28 корпус 2'
+        )
+        self.assertEqual(
+            normalize_address('Москва, Ленинградское ш., 5а стр. 1'),
+            'москва ленинградское шоссе 5а строение 1'
+        )
+        self.assertEqual(
+            normalize_address('Москва, Тверской б-р, 10, кв. 5'),
+            'москва тверской бульвар 10 квартира 5'
+        )
+
+    def test_key_fits_the_column(self):
+        address = ('ул. Ленина, д. 5 к 1 стр 2 кв 3, ' * 7)[:200]
+
+        self.assertLessEqual(
+            len(normalize_address(address)),
+            Address._meta.get_field('normalized_address').max_length
+        )
+        self.assertLessEqual(
+            len(normalize_address('к ' * 100)),
+            Address._meta.get_field('normalized_address').max_length
+        )
+
+    def test_migrated_keys_fit_the_migration_column(self):
+        migration = import_module(
+            'addresses.migrations.0006_address_normalized_address'
+        )
+        address = ('ул. Ленина, д. 5 к 1 стр 2 кв 3, ' * 7)[:200]
+        key = migration.normalize_address(address)
+
+        self.assertGreater(len(key), len(address))
+        for operation in migration.Migration.operations:
+            if hasattr(operation, 'field'):
+                self.assertLessEqual(len(key), operation.field.max_length)
+
+
+class DistanceMatrixTest(SimpleTestCase):
+    origin = (55.75, 37.62)
+    # Haversine puts the eastern point nearer, the geodesic the northern one
+    north = (55.84, 37.62)
+    east = (55.75, 37.7797)
+    far = (55.75, 37.9)
+
+    def test_unknown_coordinates_give_nan(self):
+        for precise in (False, True):
+            with self.subTest(precise=precise):
+                distances = distance_matrix(
+                    [self.origin, Address.NULL_COORDINATES],
+                    [self.north, Address.NULL_COORDINATES],
+                    precise=precise
+                )
+
+                self.assertEqual(
+                    np.isnan(distances).tolist(),
+                    [[False, True], [True, True]]
+                )
+                self.assertAlmostEqual(
+                    distances[0, 0],
+                    geopy.distance.distance(self.origin, self.north).km,
+                    delta=0.05
+                )
+
+    def test_close_calls_are_refined(self):
+        destinations = [self.north, self.east, self.far]
+
+        rough = distance_matrix([self.origin], destinations)
+        precise = distance_matrix([self.origin], destinations, precise=True)
+
+        self.assertEqual(rough[0].argmin(), 1)
+        self.assertEqual(precise[0].argmin(), 0)
+        for index in (0, 1):
+            self.assertAlmostEqual(
+                precise[0, index],
+                geopy.distance.distance(
+                    self.origin,
+                    destinations[index]
+                ).km
+            )
+        # Destinations clearly farther than the nearest one are left as is
+        self.assertEqual(precise[0, 2], rough[0, 2])
@@ -0,0 +1,96 @@
+"""Сценарий нагрузки для locust.
+
+Покупатели листают каталог и оформляют заказы, менеджеры смотрят
+заказы и меню. Запуск против локального gunicorn:
+
+    gunicorn -w 4 star_burger.wsgi:application
+    locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000
+
+Для менеджеров нужен пользователь из
+`manage.py seed_benchmark_data --manager-password ...`.
+"""
+import os
+import random
+import uuid
+
+from locust import HttpUser, between, task
+from locust.exception import StopUser
+
+
+MANAGER_USERNAME = os.getenv('BENCHMARK_MANAGER_USERNAME', 'benchmark')
+MANAGER_PASSWORD = os.getenv('BENCHMARK_MANAGER_PASSWORD')
+
+
+class Customer(HttpUser):
+    weight = 20
+    wait_time = between(1, 5)
+
+    def on_start(self):
+        response = self.client.get('/api/products/')
+        self.products_ids = [product['id'] for product in response.json()]
+
+    @task(10)
+    def browse_products(self):
+        self.client.get(
+            '/api/products/',
+            headers={'Accept-Encoding': 'br, gzip'}
+        )
+
+    @task(3)
+    def browse_banners(self):
+        self.client.get('/api/banners/')
+
+    @task(1)
+    def place_order(self):
+        if not self.products_ids:
+            return
+
+        products_ids = random.sample(
+            self.products_ids,
+            min(random.randint(1, 5), len(self.products_ids))
+        )
+        self.client.post(
+            '/api/order/',
+            json={
+                'firstname': 'Иван',
+                'lastname': 'Петров',
+                'phonenumber': '+79991234567',
+                'address': 'Москва, улица Тверская, 1',
+                'products': [
+                    {'product': product_id, 'quantity': random.randint(1, 3)}
+                    for product_id in products_ids
+                ]
+            },
+            headers={'Idempotency-Key': str(uuid.uuid4())}
+        )
+
+
+class Manager(HttpUser):
+    weight = 1
+    wait_time = between(5, 15)
+
+    def on_start(self):
+        if not MANAGER_PASSWORD:
+            raise StopUser()
+
+        self.client.get('/manager/login/')
+        self.client.post('/manager/login/', {
+            'username': MANAGER_USERNAME,
+            'password': MANAGER_PASSWORD,
+            'csrfmiddlewaretoken': self.client.cookies.get('csrftoken'),
+        })
+
+    @task(5)
+    def view_orders(self):
+        self.client.get('/manager/orders/')
+
+    @task(1)
+    def view_orders_by_status(self):
+        self.client.get(
+            '/manager/orders/?status=unperformed',
+            name='/manager/orders/?status=...'
+        )
+
+    @task(2)
+    def view_products(self):
+        self.client.get('/manager/products/')
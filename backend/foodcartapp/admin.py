@@ -1,11 +1,18 @@
 from django.conf import settings
 from django.contrib import admin
+from django.db.models import Q
 from django.http import HttpResponseRedirect
 from django.shortcuts import reverse
 from django.templatetags.static import static
 from django.utils.html import format_html
+from django.utils.decorators import method_decorator
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from star_burger.replicas import read_from_replica
+
+from .menu import get_menu_index
+from .models import ArchivedOrder
+from .models import ArchivedOrderItem
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
@@ -14,13 +21,60 @@ from .models import Order
 from .models import OrderItem
 
 
-class RestaurantMenuItemInline(admin.TabularInline):
+class CachedChoicesInlineMixin:
+    cached_choices_fields = []
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field,
+            request,
+            **kwargs
+        )
+        if formfield and db_field.name in self.cached_choices_fields:
+            # Evaluate choices once per request so that all formset rows
+            # share them instead of querying for every <select>
+            cached_choices = request.__dict__.setdefault(
+                '_admin_cached_choices',
+                {}
+            )
+            key = (db_field.model, db_field.name)
+            if key not in cached_choices:
+                cached_choices[key] = [choice for choice in formfield.choices]
+            formfield.choices = cached_choices[key]
+        return formfield
+
+
+class UnicodeSearchMixin:
+    def get_search_fields(self, request):
+        # Fields are searched with unicode_icontains: it uses trigram
+        # indexes on PostgreSQL and handles cyrillic letter case on SQLite
+        return [
+            field if field.startswith(('^', '=', '@'))
+            else f'{field}__unicode_icontains'
+            for field in super().get_search_fields(request)
+        ]
+
+
+class ReplicaChangelistMixin:
+    @method_decorator(read_from_replica)
+    def changelist_view(self, request, extra_context=None):
+        return super().changelist_view(request, extra_context)
+
+
+class RestaurantMenuItemInline(CachedChoicesInlineMixin, admin.TabularInline):
     model = RestaurantMenuItem
     extra = 0
+    cached_choices_fields = ['restaurant', 'product']
+
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request)
+            .select_related('restaurant', 'product')
+        )
 
 
 @admin.register(Restaurant)
-class RestaurantAdmin(admin.ModelAdmin):
+class RestaurantAdmin(UnicodeSearchMixin, admin.ModelAdmin):
     search_fields = [
         'name',
         'address',
@@ -37,7 +91,7 @@ class RestaurantAdmin(admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(UnicodeSearchMixin, admin.ModelAdmin):
     list_display = [
         'get_image_list_preview',
         'name',
@@ -51,8 +105,6 @@ class ProductAdmin(admin.ModelAdmin):
         'category',
     ]
     search_fields = [
-        # FIXME SQLite can not convert letter case for cyrillic words properly, so search will be buggy.
-        # Migration to PostgreSQL is necessary
         'name',
         'category__name',
     ]
@@ -111,18 +163,27 @@ class ProductCategoryAdmin(admin.ModelAdmin):
     pass
 
 
-class OrderProductsInline(admin.TabularInline):
+class OrderProductsInline(CachedChoicesInlineMixin, admin.TabularInline):
     model = OrderItem
     extra = 0
+    cached_choices_fields = ['product']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(
+    ReplicaChangelistMixin,
+    UnicodeSearchMixin,
+    admin.ModelAdmin
+):
     list_display = [
         'full_name',
         'phonenumber',
         'address',
         'status',
+        'total',
         'comment',
         'registered_at'
     ]
@@ -158,7 +219,7 @@ class OrderAdmin(admin.ModelAdmin):
         }),
         (None, {
             'fields': [
-                'price',
+                'total',
                 'pay_by',
                 'restaurant',
                 'status',
@@ -167,21 +228,37 @@ class OrderAdmin(admin.ModelAdmin):
         })
     )
 
-    readonly_fields = ('price',)
+    readonly_fields = ('total',)
 
     inlines = [OrderProductsInline]
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).calculate_prices()
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        order_id = request.resolver_match.kwargs.get('object_id')
+
+        if db_field.name == 'restaurant' and order_id:
+            products_ids = (
+                OrderItem.objects
+                .filter(order_id=order_id)
+                .values_list('product_id', flat=True)
+            )
+            capable_restaurants_ids = (
+                get_menu_index().get_capable_restaurants_ids(products_ids)
+            )
+            kwargs['queryset'] = Restaurant.objects.filter(
+                Q(pk__in=capable_restaurants_ids) | Q(orders=order_id)
+            ).distinct()
 
-    def price(self, obj):
-        return obj.price
-    price.short_description = 'цена'
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
     def full_name(self, obj):
         return f'{obj.firstname} {obj.lastname}'
     full_name.short_description = 'имя'
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Order.objects.filter(pk=form.instance.pk).recalculate_totals()
+        form.instance.refresh_from_db(fields=['total'])
+
     def response_post_save_change(self, request, obj):
         res = super().response_post_save_change(request, obj)
         next_link = request.GET.get('next')
@@ -190,3 +267,56 @@ class OrderAdmin(admin.ModelAdmin):
             return HttpResponseRedirect(next_link)
 
         return res
+
+
+class ReadOnlyAdminMixin:
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedOrderItemInline(ReadOnlyAdminMixin, admin.TabularInline):
+    model = ArchivedOrderItem
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(
+    ReadOnlyAdminMixin,
+    ReplicaChangelistMixin,
+    UnicodeSearchMixin,
+    admin.ModelAdmin
+):
+    list_display = [
+        'id',
+        'full_name',
+        'phonenumber',
+        'address',
+        'status',
+        'total',
+        'registered_at'
+    ]
+    search_fields = [
+        'firstname',
+        'lastname',
+        'phonenumber',
+        'address'
+    ]
+    list_filter = [
+        'status',
+        'registered_at'
+    ]
+    date_hierarchy = 'registered_at'
+
+    inlines = [ArchivedOrderItemInline]
+
+    def full_name(self, obj):
+        return f'{obj.firstname} {obj.lastname}'
+    full_name.short_description = 'имя'
@@ -0,0 +1,55 @@
+from django.db import transaction
+
+from .models import (
+    ArchivedOrder,
+    ArchivedOrderItem,
+    Order,
+    OrderItem,
+)
+from .signals import suppress_order_events
+
+
+def copy_to(model, instance):
+    return model(**{
+        field.attname: getattr(instance, field.attname)
+        for field in model._meta.concrete_fields
+        if hasattr(instance, field.attname) and field.attname != 'id'
+    })
+
+
+def archive_orders(registered_before, batch_size):
+    """Переносит пачку завершённых заказов в архив, возвращает их число."""
+    with transaction.atomic():
+        orders = list(
+            Order.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                status__in=Order.FINISHED_STATUSES,
+                registered_at__lt=registered_before
+            )
+            .order_by('registered_at')[:batch_size]
+        )
+        if not orders:
+            return 0
+
+        orders_ids = [order.id for order in orders]
+
+        archived_orders = []
+        for order in orders:
+            archived_order = copy_to(ArchivedOrder, order)
+            archived_order.id = order.id
+            archived_orders.append(archived_order)
+        ArchivedOrder.objects.bulk_create(archived_orders)
+
+        ArchivedOrderItem.objects.bulk_create([
+            copy_to(ArchivedOrderItem, item)
+            for item in OrderItem.objects.filter(order_id__in=orders_ids)
+        ])
+
+        # Finished orders are not on the dashboards, and a batch must not
+        # flood the order events bus. Items and registrations are deleted
+        # along with their orders.
+        with suppress_order_events():
+            Order.objects.filter(id__in=orders_ids).delete()
+
+    return len(orders)
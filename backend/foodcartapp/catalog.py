@@ -0,0 +1,34 @@
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+CATALOG_VERSION_KEY = 'foodcartapp:catalog_version'
+
+
+def init_catalog_version():
+    # Start from the current time rather than 1: if the cache is flushed,
+    # versions must not repeat ones already memoized by running workers.
+    cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        init_catalog_version()
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def is_catalog_cache_local():
+    """Версию каталога из этого процесса не увидят другие процессы."""
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        init_catalog_version()
+        return cache.incr(CATALOG_VERSION_KEY)
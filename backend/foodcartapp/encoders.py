@@ -0,0 +1,120 @@
+import gzip
+import zlib
+from itertools import islice
+
+import brotli
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+
+CONTENT_ENCODINGS = ('br', 'gzip', 'identity')
+
+
+def get_json_format():
+    return 'pretty' if settings.API_JSON_PRETTY else 'compact'
+
+
+def get_json_encoder(pretty=None):
+    if pretty is None:
+        pretty = settings.API_JSON_PRETTY
+
+    if pretty:
+        return DjangoJSONEncoder(ensure_ascii=False, indent=4)
+    return DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def dumps(data, pretty=None):
+    return get_json_encoder(pretty).encode(data).encode()
+
+
+def iter_dumps(items, pretty=None, chunk_size=None):
+    if pretty is None:
+        pretty = settings.API_JSON_PRETTY
+
+    if pretty:
+        yield dumps(list(items), pretty=True)
+        return
+
+    if chunk_size is None:
+        chunk_size = settings.API_JSON_CHUNK_SIZE
+
+    encoder = get_json_encoder(pretty=False)
+    items = iter(items)
+
+    separator = b'['
+    while chunk := list(islice(items, chunk_size)):
+        yield separator + b','.join(
+            encoder.encode(item).encode() for item in chunk
+        )
+        separator = b','
+
+    yield b']' if separator == b',' else b'[]'
+
+
+class JsonApiResponse(HttpResponse):
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(dumps(data), **kwargs)
+
+
+def parse_accept_encoding(header):
+    """Качество каждого кодирования из Accept-Encoding: {'gzip': 1.0, ...}."""
+    qualities = {}
+    for entry in header.split(','):
+        encoding, *params = [part.strip() for part in entry.split(';')]
+        if not encoding:
+            continue
+
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        qualities[encoding.lower()] = quality
+    return qualities
+
+
+def choose_content_encoding(request):
+    qualities = parse_accept_encoding(
+        request.headers.get('Accept-Encoding', '')
+    )
+    # Of equally wanted encodings the one listed first in CONTENT_ENCODINGS
+    # wins, and identity is sent when nothing else is acceptable
+    acceptable = [
+        (qualities.get(encoding, qualities.get('*', 0)), -index, encoding)
+        for index, encoding in enumerate(CONTENT_ENCODINGS)
+    ]
+    quality, _, encoding = max(acceptable)
+    return encoding if quality > 0 else 'identity'
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body)
+    return body
+
+
+def iter_compress(chunks, encoding):
+    if encoding == 'identity':
+        yield from chunks
+        return
+
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        compressed_chunk = process(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+
+    yield finish()
@@ -0,0 +1,50 @@
+from .models import (
+    Order,
+    OrderItem,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+
+
+def create_products(count, category_name='Бургеры'):
+    category, _ = ProductCategory.objects.get_or_create(name=category_name)
+    return [
+        Product.objects.create(
+            name=f'Бургер {number}',
+            category=category,
+            price=100 + number,
+            image='burger.jpg'
+        )
+        for number in range(count)
+    ]
+
+
+def create_restaurant(products=(), name='Star Burger', **fields):
+    restaurant = Restaurant.objects.create(name=name, **fields)
+    RestaurantMenuItem.objects.bulk_create([
+        RestaurantMenuItem(restaurant=restaurant, product=product)
+        for product in products
+    ])
+    return restaurant
+
+
+def create_order(products=(), quantity=1, **fields):
+    order = Order.objects.create(**{
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': '+79991234567',
+        'address': 'Москва, Тверская, 1',
+        **fields
+    })
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=product,
+            price_at_order=product.price,
+            quantity=quantity
+        )
+        for product in products
+    ])
+    return order
@@ -0,0 +1,42 @@
+from django.db.backends.signals import connection_created
+from django.db.models import CharField, TextField
+from django.db.models.lookups import IContains
+from django.dispatch import receiver
+
+
+@CharField.register_lookup
+@TextField.register_lookup
+class UnicodeIContains(IContains):
+    """icontains, который на SQLite не различает регистр и кириллицы.
+
+    На PostgreSQL это обычный icontains: UPPER(поле::text) LIKE UPPER(...),
+    под него построены триграммные индексы.
+    """
+    lookup_name = 'unicode_icontains'
+
+    def as_sql(self, compiler, connection):
+        # Backends know the operators of built-in lookups only by their names
+        return IContains(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_sqlite(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        # SQLite's LIKE and UPPER only fold ASCII letters, so both sides are
+        # casefolded by a Python function registered on each connection.
+        return (
+            f"CASEFOLD({lhs_sql}) LIKE CASEFOLD({rhs_sql}) ESCAPE '\\'",
+            lhs_params + rhs_params
+        )
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+
+    connection.connection.create_function(
+        'CASEFOLD',
+        1,
+        lambda value: value.casefold() if isinstance(value, str) else value,
+        deterministic=True
+    )
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodcartapp.archive import archive_orders
+from foodcartapp.models import OrderRegistration
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит старые завершённые заказы в архив и удаляет '
+        'просроченные ключи идемпотентности'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=settings.ORDERS_ARCHIVE_AFTER_DAYS,
+            help='сколько дней назад должен быть зарегистрирован заказ'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='сколько заказов переносить за одну транзакцию'
+        )
+
+    def handle(self, *args, **options):
+        registered_before = timezone.now() - timedelta(
+            days=options['older_than']
+        )
+
+        archived = 0
+        while True:
+            batch_archived = archive_orders(
+                registered_before,
+                options['batch_size']
+            )
+            if not batch_archived:
+                break
+            archived += batch_archived
+
+        self.stdout.write(f'Перенесено в архив заказов: {archived}')
+
+        expired, _ = OrderRegistration.objects.expired().delete()
+        self.stdout.write(f'Удалено просроченных ключей: {expired}')
@@ -0,0 +1,216 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from foodcartapp.menu import get_menu_index
+
+
+def read_body(response):
+    # Streaming responses do their work only while the body is consumed
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def get_percentile(timings, percent):
+    return statistics.quantiles(timings, n=100, method='inclusive')[percent - 1]
+
+
+class Command(BaseCommand):
+    help = 'Замеряет задержку, число запросов к базе и память основных страниц'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios',
+            nargs='*',
+            help='какие сценарии запускать, по умолчанию все'
+        )
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--output',
+            help='сохранить результаты в JSON, чтобы потом сравнить с ними'
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON с результатами прошлого запуска'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='на какую долю можно ухудшить p95 и память, по умолчанию 0.2'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('Нужно хотя бы две итерации')
+        if settings.DEBUG:
+            self.stderr.write(
+                'DEBUG включён: debug toolbar и отладка замедляют ответы, '
+                'для честных замеров запускайте с DEBUG=false'
+            )
+
+        self.random = random.Random(options['seed'])
+        self.products_ids = sorted(
+            get_menu_index().get_available_products_ids()
+        )
+        self.storefront = Client()
+        self.manager = Client()
+        self.manager.force_login(User.objects.get_or_create(
+            username='benchmark',
+            defaults={'is_staff': True}
+        )[0])
+
+        scenarios = {
+            'products': (None, self.get_products),
+            'products_uncached': (cache.clear, self.get_products),
+            'register_order': (None, self.register_order),
+            'view_orders': (None, self.view_orders),
+            'view_products': (None, self.view_products),
+        }
+        unknown_scenarios = set(options['scenarios']) - scenarios.keys()
+        if unknown_scenarios:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown_scenarios))}'
+            )
+
+        results = {}
+        # The test client always sends Host: testserver
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name in options['scenarios'] or scenarios:
+                prepare, request = scenarios[name]
+                results[name] = self.run_scenario(
+                    name,
+                    prepare,
+                    request,
+                    options['iterations'],
+                    options['warmup']
+                )
+                self.write_result(name, results[name])
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+            self.compare(results, baseline, options['threshold'])
+
+    def run_scenario(self, name, prepare, request, iterations, warmup):
+        for _ in range(warmup):
+            if prepare:
+                prepare()
+            response = request()
+            read_body(response)
+            self.check_response(name, response)
+
+        timings = []
+        queries_counts = []
+        for _ in range(iterations):
+            if prepare:
+                prepare()
+            with CaptureQueriesContext(connection) as queries:
+                started_at = time.perf_counter()
+                read_body(request())
+                timings.append(time.perf_counter() - started_at)
+            queries_counts.append(len(queries))
+
+        if prepare:
+            prepare()
+        tracemalloc.start()
+        read_body(request())
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'p50_ms': get_percentile(timings, 50) * 1000,
+            'p95_ms': get_percentile(timings, 95) * 1000,
+            'p99_ms': get_percentile(timings, 99) * 1000,
+            'queries': max(queries_counts),
+            'memory_kb': peak_memory // 1024,
+        }
+
+    def check_response(self, name, response):
+        if response.status_code >= 400:
+            raise CommandError(
+                f'Сценарий {name}: ответ {response.status_code}'
+            )
+
+    def write_result(self, name, result):
+        self.stdout.write(
+            f'{name:<18} p50 {result["p50_ms"]:>8.1f} мс  '
+            f'p95 {result["p95_ms"]:>8.1f} мс  '
+            f'p99 {result["p99_ms"]:>8.1f} мс  '
+            f'запросов {result["queries"]:>4}  '
+            f'память {result["memory_kb"]:>7} КБ'
+        )
+
+    def compare(self, results, baseline, threshold):
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            previous = baseline[name]
+
+            for metric in ('p95_ms', 'memory_kb'):
+                if result[metric] > previous[metric] * (1 + threshold):
+                    regressions.append(
+                        f'{name}: {metric} {previous[metric]:.1f} '
+                        f'→ {result[metric]:.1f}'
+                    )
+            if result['queries'] > previous['queries']:
+                regressions.append(
+                    f'{name}: queries {previous["queries"]} '
+                    f'→ {result["queries"]}'
+                )
+
+        for regression in regressions:
+            self.stderr.write(regression)
+        if regressions:
+            raise CommandError('Производительность ухудшилась')
+
+        self.stdout.write('Регрессий нет')
+
+    def get_products(self):
+        return self.storefront.get('/api/products/')
+
+    def register_order(self):
+        if not self.products_ids:
+            raise CommandError('В базе нет доступных товаров')
+
+        # Orders are rolled back to keep the data set the same between runs
+        with transaction.atomic():
+            response = self.storefront.post('/api/order/', {
+                'firstname': 'Иван',
+                'lastname': 'Петров',
+                'phonenumber': '+79991234567',
+                'address': 'Москва, улица Тверская, 1',
+                'products': [
+                    {'product': product_id, 'quantity': 1}
+                    for product_id in self.random.sample(
+                        self.products_ids,
+                        min(3, len(self.products_ids))
+                    )
+                ]
+            }, content_type='application/json')
+            transaction.set_rollback(True)
+        return response
+
+    def view_orders(self):
+        return self.manager.get('/manager/orders/')
+
+    def view_products(self):
+        return self.manager.get('/manager/products/')
@@ -0,0 +1,74 @@
+import gzip
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.encoders import dumps, iter_dumps
+
+
+def make_products(count):
+    return [
+        {
+            'id': product_id,
+            'name': f'Чизбургер {product_id}',
+            'price': Decimal('199.00'),
+            'special_status': product_id % 10 == 0,
+            'description': 'Сочная котлета из говядины, сыр чеддер, '
+                           'маринованные огурцы, лук, кетчуп и горчица.',
+            'category': {
+                'id': product_id % 5,
+                'name': 'Бургеры',
+            },
+            'image': f'/media/burger_{product_id}.jpg',
+            'restaurant': {
+                'id': product_id,
+                'name': f'Чизбургер {product_id}',
+            }
+        }
+        for product_id in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает размер и скорость кодирования каталога в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        products = make_products(options['products'])
+
+        encoders = {
+            'pretty': lambda: dumps(products, pretty=True),
+            'compact': lambda: dumps(products, pretty=False),
+            'streaming': lambda: b''.join(
+                iter_dumps(iter(products), pretty=False)
+            ),
+        }
+
+        self.stdout.write(
+            f'{"формат":<10} {"байт":>10} {"gzip":>8} '
+            f'{"медиана, мс":>12} {"пик памяти, КБ":>15}'
+        )
+
+        for name, encode in encoders.items():
+            timings = []
+            for _ in range(options['repeat']):
+                started_at = time.perf_counter()
+                body = encode()
+                timings.append(time.perf_counter() - started_at)
+
+            tracemalloc.start()
+            encode()
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f'{name:<10} {len(body):>10} {len(gzip.compress(body)):>8} '
+                f'{statistics.median(timings) * 1000:>12.1f} '
+                f'{peak_memory // 1024:>15}'
+            )
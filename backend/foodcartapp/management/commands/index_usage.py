@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+INDEX_USAGE_SQL = '''
+    SELECT
+        stats.relname,
+        stats.indexrelname,
+        stats.idx_scan,
+        stats.idx_tup_read,
+        pg_size_pretty(pg_relation_size(stats.indexrelid)),
+        indexes.indisunique
+    FROM pg_stat_user_indexes AS stats
+    JOIN pg_index AS indexes ON indexes.indexrelid = stats.indexrelid
+    WHERE stats.relname = ANY(%s)
+    ORDER BY stats.idx_scan, pg_relation_size(stats.indexrelid) DESC
+'''
+
+STATS_RESET_SQL = '''
+    SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()
+'''
+
+
+class Command(BaseCommand):
+    help = 'Показывает, как часто PostgreSQL использует индексы таблиц проекта'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--unused',
+            action='store_true',
+            help='только неуникальные индексы, которые ни разу не использовались'
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='база данных, по умолчанию default'
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'Статистика использования индексов есть только в PostgreSQL'
+            )
+
+        tables = connection.introspection.django_table_names(
+            only_existing=True
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(INDEX_USAGE_SQL, [tables])
+            indexes = cursor.fetchall()
+            cursor.execute(STATS_RESET_SQL)
+            stats_reset, = cursor.fetchone()
+
+        self.stdout.write(f'Статистика собирается с {stats_reset or "запуска базы"}')
+
+        for table, index, scans, tuples_read, size, is_unique in indexes:
+            if options['unused'] and (scans or is_unique):
+                continue
+            self.stdout.write(
+                f'{table}.{index}: сканирований {scans}, '
+                f'прочитано строк {tuples_read}, размер {size}'
+            )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые суммы заказов по их позициям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='только сверить суммы, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            updated = Order.objects.recalculate_totals()
+            self.stdout.write(f'Пересчитано заказов: {updated}')
+
+        mismatched_orders = (
+            Order.objects
+            .calculate_prices()
+            .exclude(total=Coalesce('price', Value(0)))
+            .values_list('id', 'total', 'price')
+        )
+
+        for order_id, total, price in mismatched_orders:
+            self.stderr.write(
+                f'Заказ {order_id}: сохранено {total}, по позициям {price or 0}'
+            )
+
+        if mismatched_orders:
+            raise CommandError('Суммы заказов расходятся с позициями')
+
+        self.stdout.write('Суммы заказов сходятся')
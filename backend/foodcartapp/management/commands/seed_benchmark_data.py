@@ -0,0 +1,243 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from addresses.models import Address
+from addresses.normalization import normalize_address
+from foodcartapp.catalog import bump_catalog_version
+from foodcartapp.models import (
+    Order,
+    OrderItem,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+
+
+CATEGORIES = [
+    'Бургеры', 'Роллы', 'Напитки', 'Десерты', 'Салаты',
+    'Супы', 'Закуски', 'Соусы', 'Комбо', 'Завтраки',
+]
+STREETS = [
+    'Тверская', 'Арбат', 'Мясницкая', 'Покровка', 'Сретенка',
+    'Пятницкая', 'Остоженка', 'Маросейка', 'Лубянка', 'Петровка',
+]
+FIRSTNAMES = ['Иван', 'Мария', 'Алексей', 'Анна', 'Дмитрий', 'Елена']
+LASTNAMES = ['Петров', 'Иванова', 'Смирнов', 'Кузнецова', 'Попов']
+
+
+def get_next_id(model):
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+def random_address(number):
+    street = STREETS[number % len(STREETS)]
+    return f'Москва, улица {street}, {number // len(STREETS) + 1}'
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу каталогом и заказами для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--restaurants', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=200000)
+        parser.add_argument(
+            '--addresses',
+            type=int,
+            default=5000,
+            help='сколько разных адресов доставки использовать в заказах'
+        )
+        parser.add_argument(
+            '--active-share',
+            type=float,
+            default=0.05,
+            help='доля незавершённых заказов'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--manager-password',
+            help='создать менеджера benchmark с этим паролем для locust'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        with transaction.atomic():
+            products = self.create_products(options['products'])
+            restaurants = self.create_restaurants(options['restaurants'])
+            self.create_menu(restaurants, products)
+
+        addresses = [
+            random_address(number) for number in range(options['addresses'])
+        ]
+        self.create_addresses(
+            addresses + [restaurant.address for restaurant in restaurants]
+        )
+        self.create_orders(
+            options['orders'],
+            products,
+            addresses,
+            options['active_share']
+        )
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(),
+                [Product, Restaurant, Order, OrderItem]
+            ):
+                cursor.execute(sql)
+
+        # bulk_create sends no signals, so cached catalogs are dropped here
+        bump_catalog_version()
+
+        if options['manager_password']:
+            manager, _ = User.objects.get_or_create(
+                username='benchmark',
+                defaults={'is_staff': True}
+            )
+            manager.set_password(options['manager_password'])
+            manager.save()
+
+    def create_products(self, count):
+        categories = [
+            ProductCategory.objects.get_or_create(name=name)[0]
+            for name in CATEGORIES
+        ]
+
+        first_id = get_next_id(Product)
+        products = [
+            Product(
+                id=product_id,
+                name=f'Товар {product_id}',
+                category=self.random.choice(categories),
+                price=Decimal(self.random.randrange(99, 999)),
+                image='benchmark.jpg',
+                special_status=self.random.random() < 0.1,
+                description='Описание товара для нагрузочного тестирования.'
+            )
+            for product_id in range(first_id, first_id + count)
+        ]
+        Product.objects.bulk_create(products, batch_size=self.batch_size)
+
+        self.stdout.write(f'Товаров: {count}')
+        return products
+
+    def create_restaurants(self, count):
+        first_id = get_next_id(Restaurant)
+        restaurants = [
+            Restaurant(
+                id=restaurant_id,
+                name=f'Star Burger {restaurant_id}',
+                address=random_address(restaurant_id * 7),
+                contact_phone='+74951234567'
+            )
+            for restaurant_id in range(first_id, first_id + count)
+        ]
+        Restaurant.objects.bulk_create(restaurants, batch_size=self.batch_size)
+
+        self.stdout.write(f'Ресторанов: {count}')
+        return restaurants
+
+    def create_menu(self, restaurants, products):
+        menu_items = []
+        for restaurant in restaurants:
+            menu_size = int(len(products) * self.random.uniform(0.3, 0.6))
+            menu_items += [
+                RestaurantMenuItem(
+                    restaurant=restaurant,
+                    product=product,
+                    availability=self.random.random() < 0.9
+                )
+                for product in self.random.sample(products, menu_size)
+            ]
+        RestaurantMenuItem.objects.bulk_create(
+            menu_items,
+            batch_size=self.batch_size
+        )
+
+        self.stdout.write(f'Пунктов меню: {len(menu_items)}')
+
+    def create_addresses(self, addresses):
+        now = timezone.now()
+        Address.objects.bulk_create(
+            [
+                Address(
+                    address=address,
+                    normalized_address=normalize_address(address),
+                    latitude=self.random.uniform(55.6, 55.9),
+                    longitude=self.random.uniform(37.4, 37.8),
+                    coordinates_update_date=now,
+                    expires_at=now + timedelta(days=365)
+                )
+                for address in set(addresses)
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+
+    def create_orders(self, count, products, addresses, active_share):
+        now = timezone.now()
+        next_order_id = get_next_id(Order)
+        active_statuses = [
+            status for status in Order.Status
+            if status not in Order.FINISHED_STATUSES
+        ]
+
+        for batch_start in range(0, count, self.batch_size):
+            batch_count = min(self.batch_size, count - batch_start)
+            orders = []
+            items = []
+
+            for order_id in range(next_order_id, next_order_id + batch_count):
+                order_products = self.random.sample(
+                    products,
+                    self.random.randint(1, 5)
+                )
+                order_items = [
+                    OrderItem(
+                        order_id=order_id,
+                        product=product,
+                        price_at_order=product.price,
+                        quantity=self.random.randint(1, 3)
+                    )
+                    for product in order_products
+                ]
+                items += order_items
+
+                is_active = self.random.random() < active_share
+                orders.append(Order(
+                    id=order_id,
+                    firstname=self.random.choice(FIRSTNAMES),
+                    lastname=self.random.choice(LASTNAMES),
+                    phonenumber='+79991234567',
+                    address=self.random.choice(addresses),
+                    status=self.random.choice(
+                        active_statuses if is_active
+                        else Order.FINISHED_STATUSES
+                    ),
+                    registered_at=now - timedelta(
+                        minutes=self.random.randint(0, 60 * 24 * 365)
+                    ),
+                    total=sum(
+                        item.price_at_order * item.quantity
+                        for item in order_items
+                    )
+                ))
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create(items)
+
+            next_order_id += batch_count
+            self.stdout.write(f'Заказов: {batch_start + batch_count}/{count}')
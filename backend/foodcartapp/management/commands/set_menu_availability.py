@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.catalog import is_catalog_cache_local
+from foodcartapp.models import Restaurant, RestaurantMenuItem
+
+
+LOCAL_CACHE_WARNING = (
+    'Кэш хранится в памяти этого процесса: сайт увидит изменения только '
+    'через CATALOG_CACHE_TIMEOUT. Задайте общий кэш в CACHE или меняйте '
+    'доступность через POST /api/menu/availability/'
+)
+
+
+class Command(BaseCommand):
+    help = 'Включает или снимает с продажи товары в меню ресторана'
+
+    def add_arguments(self, parser):
+        parser.add_argument('restaurant', type=int, help='id ресторана')
+        parser.add_argument(
+            'products',
+            type=int,
+            nargs='*',
+            help='id товаров, по умолчанию всё меню ресторана'
+        )
+        availability = parser.add_mutually_exclusive_group(required=True)
+        availability.add_argument(
+            '--available',
+            dest='available',
+            action='store_true',
+            help='вернуть товары в продажу'
+        )
+        availability.add_argument(
+            '--unavailable',
+            dest='available',
+            action='store_false',
+            help='снять товары с продажи'
+        )
+
+    def handle(self, *args, **options):
+        restaurant_id = options['restaurant']
+        if not Restaurant.objects.filter(pk=restaurant_id).exists():
+            raise CommandError(f'Ресторан {restaurant_id} не найден')
+
+        products_ids = options['products'] or (
+            RestaurantMenuItem.objects
+            .filter(restaurant_id=restaurant_id)
+            .values_list('product_id', flat=True)
+        )
+
+        updated = RestaurantMenuItem.objects.set_availability(
+            [(restaurant_id, product_id) for product_id in products_ids],
+            options['available']
+        )
+
+        self.stdout.write(f'Изменено пунктов меню: {updated}')
+        if is_catalog_cache_local():
+            self.stderr.write(LOCAL_CACHE_WARNING)
@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from star_burger.metrics import record_cache_lookup
+
+from .catalog import bump_catalog_version, get_catalog_version
+from .models import RestaurantMenuItem
+
+
+class MenuIndex:
+    def __init__(self, restaurants_products):
+        restaurants = sorted(restaurants_products, key=lambda r: r.id)
+        self.restaurants = [
+            restaurant for restaurant in restaurants
+            if restaurants_products[restaurant]
+        ]
+
+        self.restaurant_products = {
+            restaurant.id: frozenset(restaurants_products[restaurant])
+            for restaurant in self.restaurants
+        }
+
+        product_restaurants = defaultdict(set)
+        for restaurant_id, products_ids in self.restaurant_products.items():
+            for product_id in products_ids:
+                product_restaurants[product_id].add(restaurant_id)
+
+        self.product_restaurants = {
+            product_id: frozenset(restaurants_ids)
+            for product_id, restaurants_ids in product_restaurants.items()
+        }
+
+    @classmethod
+    def build(cls):
+        # The index is cached per catalog version, so it is always built from
+        # the primary database: a lagging replica would pin a stale menu
+        grouped_menu_items = (
+            RestaurantMenuItem.objects
+            .db_manager(DEFAULT_DB_ALIAS)
+            .group_by_restaurant()
+        )
+        return cls({
+            restaurant: [menu_item.product_id for menu_item in menu_items]
+            for restaurant, menu_items in grouped_menu_items.items()
+        })
+
+    def with_menu_item(self, restaurant, product_id, available):
+        restaurants_products = {
+            known_restaurant: set(self.restaurant_products[known_restaurant.id])
+            for known_restaurant in self.restaurants
+        }
+        products_ids = restaurants_products.setdefault(restaurant, set())
+
+        if available:
+            products_ids.add(product_id)
+        else:
+            products_ids.discard(product_id)
+
+        return MenuIndex(restaurants_products)
+
+    def get_available_products_ids(self):
+        return set(self.product_restaurants)
+
+    def get_capable_restaurants_ids(self, products_ids):
+        capable_restaurants_ids = set(self.restaurant_products)
+
+        for product_id in set(products_ids):
+            capable_restaurants_ids &= self.product_restaurants.get(
+                product_id,
+                frozenset()
+            )
+            if not capable_restaurants_ids:
+                break
+
+        return capable_restaurants_ids
+
+    def get_capable_restaurants(self, products_ids):
+        capable_restaurants_ids = self.get_capable_restaurants_ids(
+            products_ids
+        )
+        return [
+            restaurant for restaurant in self.restaurants
+            if restaurant.id in capable_restaurants_ids
+        ]
+
+
+local_menu_index = (None, None)
+
+
+def get_menu_index_key(version):
+    return f'foodcartapp:menu_index:{version}'
+
+
+def get_menu_index():
+    global local_menu_index
+
+    version = get_catalog_version()
+
+    local_version, local_index = local_menu_index
+    record_cache_lookup('menu_index_local', local_version == version)
+    if local_version == version:
+        return local_index
+
+    index = cache.get(get_menu_index_key(version))
+    record_cache_lookup('menu_index', index is not None)
+    if index is None:
+        index = MenuIndex.build()
+        cache.set(
+            get_menu_index_key(version),
+            index,
+            timeout=settings.CATALOG_CACHE_TIMEOUT
+        )
+
+    local_menu_index = (version, index)
+
+    return index
+
+
+def apply_menu_item_change(restaurant, product_id, available):
+    version = get_catalog_version()
+    index = cache.get(get_menu_index_key(version))
+
+    new_version = bump_catalog_version()
+
+    if index is not None and new_version == version + 1:
+        cache.set(
+            get_menu_index_key(new_version),
+            index.with_menu_item(restaurant, product_id, available),
+            timeout=settings.CATALOG_CACHE_TIMEOUT
+        )
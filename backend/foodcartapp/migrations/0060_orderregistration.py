@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 17:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0059_alter_order_restaurant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRegistration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='ключ идемпотентности')),
+                ('response_data', models.JSONField(null=True, verbose_name='ответ')),
+                ('registered_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='когда зарегистрирован')),
+                ('order', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='registration', to='foodcartapp.order', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'регистрация заказа',
+                'verbose_name_plural': 'регистрации заказов',
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-18 17:31
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_orders_totals(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+
+    items_totals = (
+        OrderItem.objects
+        .filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum(F('price_at_order') * F('quantity')))
+        .values('total')
+    )
+    Order.objects.update(
+        total=Coalesce(
+            Subquery(items_totals, output_field=models.DecimalField()),
+            Value(0),
+            output_field=models.DecimalField()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0060_orderregistration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='сумма'),
+        ),
+        migrations.RunPython(fill_orders_totals, migrations.RunPython.noop),
+    ]
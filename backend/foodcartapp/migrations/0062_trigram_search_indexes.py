@@ -0,0 +1,56 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+TRIGRAM_INDEXES = [
+    ('foodcartapp_order', 'firstname'),
+    ('foodcartapp_order', 'lastname'),
+    ('foodcartapp_order', 'phonenumber'),
+    ('foodcartapp_order', 'address'),
+    ('foodcartapp_order', 'comment'),
+    ('foodcartapp_product', 'name'),
+]
+
+
+def get_index_name(table, column):
+    return f'{table}_{column}_trgm'
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    quote_name = schema_editor.quote_name
+    for table, column in TRIGRAM_INDEXES:
+        # The expression matches the SQL of icontains lookups on PostgreSQL:
+        # UPPER("column"::text) LIKE UPPER('%term%')
+        schema_editor.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+            f'{quote_name(get_index_name(table, column))} '
+            f'ON {quote_name(table)} '
+            f'USING gin ((UPPER({quote_name(column)}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS '
+            f'{schema_editor.quote_name(get_index_name(table, column))}'
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('foodcartapp', '0061_order_total'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2 on 2026-10-18 17:38
+
+from django.db import migrations, models
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0062_trigram_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='address',
+            field=models.CharField(max_length=200, verbose_name='адрес'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='called_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='когда сделан звонок'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='когда доставлен'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='firstname',
+            field=models.CharField(max_length=100, verbose_name='имя'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='lastname',
+            field=models.CharField(max_length=100, verbose_name='фамилия'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='pay_by',
+            field=models.CharField(choices=[('cash', 'Наличностью'), ('card', 'Электронно'), ('not chosen', 'Не выбран')], default='not chosen', max_length=50, verbose_name='способ оплаты'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='phonenumber',
+            field=phonenumber_field.modelfields.PhoneNumberField(max_length=128, region=None, verbose_name='телефон'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('unperformed', 'Необработанный'), ('in work', 'В работе'), ('delivery', 'Доставляется'), ('completed', 'Выполнен'), ('rejected', 'Отменен'), ('failed', 'Завершен неудачно')], default='unperformed', max_length=50, verbose_name='статус'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(_negated=True, status__in=['completed', 'rejected', 'failed']), fields=['registered_at', 'id'], name='order_active_registered_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'registered_at'], name='order_status_registered_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2 on 2026-10-18 17:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0063_order_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='номер заказа')),
+                ('address', models.CharField(max_length=200, verbose_name='адрес')),
+                ('firstname', models.CharField(max_length=100, verbose_name='имя')),
+                ('lastname', models.CharField(max_length=100, verbose_name='фамилия')),
+                ('phonenumber', phonenumber_field.modelfields.PhoneNumberField(max_length=128, region=None, verbose_name='телефон')),
+                ('status', models.CharField(choices=[('unperformed', 'Необработанный'), ('in work', 'В работе'), ('delivery', 'Доставляется'), ('completed', 'Выполнен'), ('rejected', 'Отменен'), ('failed', 'Завершен неудачно')], max_length=50, verbose_name='статус')),
+                ('comment', models.TextField(blank=True, verbose_name='комментарий')),
+                ('registered_at', models.DateTimeField(db_index=True, verbose_name='когда зарегистрирован')),
+                ('called_at', models.DateTimeField(null=True, verbose_name='когда сделан звонок')),
+                ('delivered_at', models.DateTimeField(null=True, verbose_name='когда доставлен')),
+                ('pay_by', models.CharField(choices=[('cash', 'Наличностью'), ('card', 'Электронно'), ('not chosen', 'Не выбран')], max_length=50, verbose_name='способ оплаты')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='сумма')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='когда перенесён в архив')),
+                ('restaurant', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'архивный заказ',
+                'verbose_name_plural': 'архивные заказы',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_at_order', models.DecimalField(decimal_places=2, max_digits=8, verbose_name='цена')),
+                ('quantity', models.IntegerField(verbose_name='количество')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='foodcartapp.archivedorder', verbose_name='заказ')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders_items', to='foodcartapp.product', verbose_name='продукт')),
+            ],
+            options={
+                'verbose_name': 'заказанный продукт в архиве',
+                'verbose_name_plural': 'заказанные продукты в архиве',
+            },
+        ),
+    ]
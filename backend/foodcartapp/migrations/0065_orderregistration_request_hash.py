@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0064_archived_orders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderregistration',
+            name='request_hash',
+            field=models.CharField(blank=True, help_text='ключ можно повторить только с тем же телом запроса', max_length=64, verbose_name='хеш запроса'),
+        ),
+    ]
@@ -1,12 +1,19 @@
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
 from itertools import groupby
-from operator import attrgetter
+from operator import attrgetter, or_
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
-from django.db.models import Sum, F
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .catalog import bump_catalog_version
+
 
 class Restaurant(models.Model):
     name = models.CharField(
@@ -34,12 +41,11 @@ class Restaurant(models.Model):
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+        from .menu import get_menu_index
+
+        return self.filter(
+            pk__in=get_menu_index().get_available_products_ids()
         )
-        return self.filter(pk__in=products)
 
 
 class ProductCategory(models.Model):
@@ -113,6 +119,32 @@ class RestaurantMenuItemQuerySet(models.QuerySet):
 
         return grouped_menu_items
 
+    def set_availability(self, menu_items, available):
+        """Переключает доступность пар (ресторан, товар) одним UPDATE."""
+        restaurants_products = defaultdict(set)
+        for restaurant_id, product_id in menu_items:
+            restaurants_products[restaurant_id].add(product_id)
+
+        if not restaurants_products:
+            return 0
+
+        updated = (
+            self.filter(reduce(or_, (
+                Q(restaurant_id=restaurant_id, product_id__in=products_ids)
+                for restaurant_id, products_ids in restaurants_products.items()
+            )))
+            .exclude(availability=available)
+            .update(availability=available)
+        )
+
+        # update() sends no signals, so the catalog is invalidated here once
+        # for the whole batch instead of per menu item
+        if updated:
+            bump_catalog_version()
+            transaction.on_commit(bump_catalog_version)
+
+        return updated
+
 
 class RestaurantMenuItem(models.Model):
     restaurant = models.ForeignKey(
@@ -145,6 +177,17 @@ class RestaurantMenuItem(models.Model):
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        menu_item = super().from_db(db, field_names, values)
+        # Lets signals see which menu pair an edited row moves away from
+        loaded_values = dict(zip(field_names, values))
+        menu_item._loaded_key = (
+            loaded_values.get('restaurant_id'),
+            loaded_values.get('product_id')
+        )
+        return menu_item
+
 
 class OrderQuerySet(models.QuerySet):
     def calculate_prices(self):
@@ -152,6 +195,22 @@ class OrderQuerySet(models.QuerySet):
             price=Sum(F('items__price_at_order') * F('items__quantity'))
         )
 
+    def recalculate_totals(self):
+        items_totals = (
+            OrderItem.objects
+            .filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(total=Sum(F('price_at_order') * F('quantity')))
+            .values('total')
+        )
+        return self.update(
+            total=Coalesce(
+                Subquery(items_totals, output_field=models.DecimalField()),
+                Value(0),
+                output_field=models.DecimalField()
+            )
+        )
+
 
 class Order(models.Model):
     class Status(models.TextChoices):
@@ -175,30 +234,25 @@ class Order(models.Model):
 
     address = models.CharField(
         max_length=200,
-        verbose_name='адрес',
-        db_index=True
+        verbose_name='адрес'
     )
 
     firstname = models.CharField(
         max_length=100,
-        verbose_name='имя',
-        db_index=True
+        verbose_name='имя'
     )
     lastname = models.CharField(
         max_length=100,
-        verbose_name='фамилия',
-        db_index=True
+        verbose_name='фамилия'
     )
 
     phonenumber = PhoneNumberField(
-        verbose_name='телефон',
-        db_index=True
+        verbose_name='телефон'
     )
 
     status = models.CharField(
         max_length=50,
         verbose_name='статус',
-        db_index=True,
         choices=Status.choices,
         default=Status.UNPERFORMED
     )
@@ -216,14 +270,12 @@ class Order(models.Model):
 
     called_at = models.DateTimeField(
         verbose_name='когда сделан звонок',
-        db_index=True,
         null=True,
         blank=True
     )
 
     delivered_at = models.DateTimeField(
         verbose_name='когда доставлен',
-        db_index=True,
         null=True,
         blank=True
     )
@@ -232,8 +284,7 @@ class Order(models.Model):
         max_length=50,
         verbose_name='способ оплаты',
         choices=PayBy.choices,
-        default=PayBy.NOT_CHOSEN,
-        db_index=True
+        default=PayBy.NOT_CHOSEN
     )
 
     restaurant = models.ForeignKey(
@@ -246,11 +297,37 @@ class Order(models.Model):
         default=None
     )
 
+    total = models.DecimalField(
+        'сумма',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+        validators=[MinValueValidator(0)]
+    )
+
     objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
+        indexes = [
+            # Manager dashboard: unfinished orders paginated by
+            # (registered_at, id). The statuses are Order.FINISHED_STATUSES
+            models.Index(
+                fields=['registered_at', 'id'],
+                condition=~Q(status__in=[
+                    'completed',
+                    'rejected',
+                    'failed',
+                ]),
+                name='order_active_registered_idx'
+            ),
+            models.Index(
+                fields=['status', 'registered_at'],
+                name='order_status_registered_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Заказ на {self.address}'
@@ -288,4 +365,126 @@ class OrderItem(models.Model):
         )
 
     def __str__(self):
-        return f'{self.product} ({self.quantity} шт.) в заказе {self.order.id}'
+        return f'{self.product} ({self.quantity} шт.) в заказе {self.order_id}'
+
+
+def get_registrations_expiry():
+    return timezone.now() - timedelta(
+        seconds=settings.ORDER_IDEMPOTENCY_KEY_TTL
+    )
+
+
+class OrderRegistrationQuerySet(models.QuerySet):
+    def expired(self):
+        return self.filter(registered_at__lt=get_registrations_expiry())
+
+
+class OrderRegistration(models.Model):
+    key = models.CharField(
+        'ключ идемпотентности',
+        max_length=100,
+        unique=True
+    )
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='registration',
+        verbose_name='заказ',
+        null=True
+    )
+    request_hash = models.CharField(
+        'хеш запроса',
+        max_length=64,
+        blank=True,
+        help_text='ключ можно повторить только с тем же телом запроса'
+    )
+    response_data = models.JSONField(
+        'ответ',
+        null=True
+    )
+    registered_at = models.DateTimeField(
+        'когда зарегистрирован',
+        default=timezone.now,
+        db_index=True
+    )
+
+    objects = OrderRegistrationQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'регистрация заказа'
+        verbose_name_plural = 'регистрации заказов'
+
+    def __str__(self):
+        return self.key
+
+    def is_expired(self):
+        return self.registered_at < get_registrations_expiry()
+
+
+class ArchivedOrder(models.Model):
+    id = models.IntegerField('номер заказа', primary_key=True)
+    address = models.CharField('адрес', max_length=200)
+    firstname = models.CharField('имя', max_length=100)
+    lastname = models.CharField('фамилия', max_length=100)
+    phonenumber = PhoneNumberField('телефон')
+    status = models.CharField(
+        'статус',
+        max_length=50,
+        choices=Order.Status.choices
+    )
+    comment = models.TextField('комментарий', blank=True)
+    registered_at = models.DateTimeField('когда зарегистрирован', db_index=True)
+    called_at = models.DateTimeField('когда сделан звонок', null=True)
+    delivered_at = models.DateTimeField('когда доставлен', null=True)
+    pay_by = models.CharField(
+        'способ оплаты',
+        max_length=50,
+        choices=Order.PayBy.choices
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        verbose_name='ресторан',
+        related_name='archived_orders',
+        on_delete=models.SET_NULL,
+        null=True
+    )
+    total = models.DecimalField('сумма', max_digits=10, decimal_places=2)
+    archived_at = models.DateTimeField(
+        'когда перенесён в архив',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'архивный заказ'
+        verbose_name_plural = 'архивные заказы'
+
+    def __str__(self):
+        return f'Заказ на {self.address}'
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name='заказ'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='archived_orders_items',
+        verbose_name='продукт'
+    )
+    price_at_order = models.DecimalField(
+        'цена',
+        max_digits=8,
+        decimal_places=2
+    )
+    quantity = models.IntegerField('количество')
+
+    class Meta:
+        verbose_name = 'заказанный продукт в архиве'
+        verbose_name_plural = 'заказанные продукты в архиве'
+
+    def __str__(self):
+        return f'{self.product} ({self.quantity} шт.) в заказе {self.order_id}'
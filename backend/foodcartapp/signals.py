@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .menu import apply_menu_item_change
+from .models import Product, ProductCategory, Restaurant, RestaurantMenuItem
+
+
+order_events_suppressed = ContextVar('order_events_suppressed', default=False)
+
+
+@contextmanager
+def suppress_order_events():
+    """Изменения заказов внутри блока не попадают на страницу заказов."""
+    token = order_events_suppressed.set(True)
+    try:
+        yield
+    finally:
+        order_events_suppressed.reset(token)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def update_menu_index(sender, instance, signal, **kwargs):
+    # The version is bumped right away so the changing transaction itself
+    # never reads a stale index, and once more after commit together with
+    # the patched index, so other workers can't cache uncommitted state.
+    bump_catalog_version()
+
+    key = (instance.restaurant_id, instance.product_id)
+    loaded_key = getattr(instance, '_loaded_key', None)
+    instance._loaded_key = key
+    if signal is post_save and not kwargs['created'] and loaded_key != key:
+        # The patch can't drop the pair the row had before, so the index
+        # is rebuilt instead
+        transaction.on_commit(bump_catalog_version)
+        return
+
+    restaurant = Restaurant(pk=instance.restaurant_id)
+    if signal is post_save:
+        restaurant = instance.restaurant
+    product_id = instance.product_id
+    available = signal is post_save and instance.availability
+
+    transaction.on_commit(
+        lambda: apply_menu_item_change(restaurant, product_id, available)
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_catalog(sender, **kwargs):
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
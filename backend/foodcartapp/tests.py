@@ -0,0 +1,659 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+import brotli
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.backends.postgresql.base import (
+    DatabaseWrapper as PostgreSQLDatabaseWrapper,
+)
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .admin import UnicodeSearchMixin
+from .catalog import get_catalog_version
+from .factories import create_order, create_products, create_restaurant
+from .menu import MenuIndex, get_menu_index, get_menu_index_key
+from .models import (
+    ArchivedOrder,
+    Order,
+    OrderItem,
+    OrderRegistration,
+    Product,
+    ProductCategory,
+    RestaurantMenuItem
+)
+
+
+class RegisterOrderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(20)
+        create_restaurant(cls.products)
+        cls.unavailable_product = Product.objects.create(
+            name='Снят с продажи',
+            category=cls.products[0].category,
+            price=1,
+            image='burger.jpg'
+        )
+
+    def setUp(self):
+        cache.clear()
+        get_menu_index()
+
+    def post_order(self, products, **headers):
+        return self.client.post('/api/order/', {
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79991234567',
+            'address': 'Москва, Тверская, 1',
+            'products': [
+                {'product': product.id, 'quantity': 2}
+                for product in products
+            ]
+        }, content_type='application/json', **headers)
+
+    def test_queries_do_not_depend_on_cart_size(self):
+        for cart_size in (1, len(self.products)):
+            with self.subTest(cart_size=cart_size):
+                with self.assertNumQueries(6):
+                    response = self.post_order(self.products[:cart_size])
+                self.assertEqual(response.status_code, 200)
+
+    def test_prices_are_fixed_at_order(self):
+        self.post_order(self.products[:3])
+
+        order = Order.objects.calculate_prices().get()
+        self.assertEqual(order.price, 2 * (100 + 101 + 102))
+        self.assertEqual(order.total, order.price)
+
+    def test_unavailable_products_are_rejected(self):
+        response = self.post_order(
+            [self.products[0], self.unavailable_product]
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.unavailable_product.id), str(response.data))
+        self.assertFalse(Order.objects.exists())
+
+    def test_retried_order_is_registered_once(self):
+        first_response = self.post_order(
+            self.products[:2],
+            HTTP_IDEMPOTENCY_KEY='checkout-1'
+        )
+        with self.assertNumQueries(1):
+            retried_response = self.post_order(
+                self.products[:2],
+                HTTP_IDEMPOTENCY_KEY='checkout-1'
+            )
+
+        self.assertEqual(retried_response.status_code, 200)
+        self.assertEqual(retried_response.data, first_response.data)
+        self.assertEqual(retried_response['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_reused_key_with_other_order_is_rejected(self):
+        self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        response = self.post_order(
+            self.products[:3],
+            HTTP_IDEMPOTENCY_KEY='checkout-1'
+        )
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @override_settings(ORDER_IDEMPOTENCY_KEY_TTL=60)
+    def test_expired_key_registers_new_order(self):
+        self.post_order(self.products[:2], HTTP_IDEMPOTENCY_KEY='checkout-1')
+        OrderRegistration.objects.update(
+            registered_at=timezone.now() - timedelta(minutes=2)
+        )
+
+        response = self.post_order(
+            self.products[:2],
+            HTTP_IDEMPOTENCY_KEY='checkout-1'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class ProductListApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(3)
+        create_restaurant(cls.products)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_products(self, encoding='identity', **headers):
+        return self.client.get(
+            '/api/products/',
+            HTTP_ACCEPT_ENCODING=encoding,
+            **headers
+        )
+
+    def read_products(self, response):
+        body = (
+            b''.join(response.streaming_content) if response.streaming
+            else response.content
+        )
+        decompress = {
+            'br': brotli.decompress,
+            'gzip': gzip.decompress,
+        }.get(response.get('Content-Encoding'), bytes)
+        return json.loads(decompress(body))
+
+    def test_unchanged_catalog_is_not_modified(self):
+        etag = self.get_products()['ETag']
+
+        response = self.get_products(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_encoding_follows_q_values(self):
+        for accept_encoding, encoding in [
+            ('gzip, br', 'br'),
+            ('gzip;q=0', 'identity'),
+            ('br;q=0.1, gzip', 'gzip'),
+            ('br; q=0.5, gzip;q=0.4, identity;q=0.9', 'identity'),
+            ('*;q=0.5, br;q=0', 'gzip'),
+            ('deflate, gzip;q=abc', 'identity'),
+        ]:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.get_products(accept_encoding)
+
+                self.assertEqual(
+                    response.get('Content-Encoding', 'identity'),
+                    encoding
+                )
+                self.assertEqual(
+                    len(self.read_products(response)),
+                    len(self.products)
+                )
+
+    def test_compressed_bodies_are_the_same_json(self):
+        # The first request streams the catalog, the rest are cached
+        expected_products = self.read_products(self.get_products())
+        self.assertEqual(len(expected_products), len(self.products))
+
+        for encoding in ('gzip', 'br', 'identity'):
+            with self.subTest(encoding=encoding):
+                response = self.get_products(encoding)
+                self.assertEqual(
+                    response.get('Content-Encoding', 'identity'),
+                    encoding
+                )
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(
+                    self.read_products(response),
+                    expected_products
+                )
+
+    def test_catalog_change_changes_etag(self):
+        etag = self.get_products('gzip')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].price = 1
+            self.products[0].save()
+
+        response = self.get_products('gzip', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(
+            '1.00',
+            [product['price'] for product in self.read_products(response)]
+        )
+
+
+class AdminQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+        cls.products = create_products(10)
+        cls.admin = User.objects.create_superuser('admin')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def count_queries(self, url):
+        # Warm up the menu index and content types caches
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_order_change_page_queries_do_not_depend_on_items(self):
+        small_order = create_order(self.products[:1])
+        big_order = create_order(self.products)
+
+        self.assertEqual(
+            self.count_queries(
+                reverse('admin:foodcartapp_order_change', args=[small_order.id])
+            ),
+            self.count_queries(
+                reverse('admin:foodcartapp_order_change', args=[big_order.id])
+            )
+        )
+
+    def test_restaurant_change_page_queries_do_not_depend_on_menu(self):
+        small_restaurant = create_restaurant(
+            self.products[:1],
+            name='Star Burger 2'
+        )
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=self.restaurant, product=product)
+            for product in self.products
+        ])
+
+        self.assertEqual(
+            self.count_queries(reverse(
+                'admin:foodcartapp_restaurant_change',
+                args=[small_restaurant.id]
+            )),
+            self.count_queries(reverse(
+                'admin:foodcartapp_restaurant_change',
+                args=[self.restaurant.id]
+            ))
+        )
+
+
+class MenuAvailabilityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(10)
+        cls.restaurant = create_restaurant(cls.products)
+        cls.manager = User.objects.create_user('manager', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def post_availability(self, products, available):
+        return self.client.post('/api/menu/availability/', {
+            'available': available,
+            'menu_items': [
+                {'restaurant': self.restaurant.id, 'product': product.id}
+                for product in products
+            ]
+        }, content_type='application/json')
+
+    def test_availability_is_switched_in_one_update(self):
+        self.client.force_login(self.manager)
+        version = get_catalog_version()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_availability(self.products[:8], False)
+
+        self.assertEqual(response.data, {'updated': 8})
+        self.assertEqual(
+            len([
+                query for query in queries.captured_queries
+                if query['sql'].startswith('UPDATE')
+            ]),
+            1
+        )
+        self.assertEqual(get_catalog_version(), version + 1)
+        self.assertEqual(
+            get_menu_index().get_available_products_ids(),
+            {product.id for product in self.products[8:]}
+        )
+
+    def test_command_warns_about_local_cache(self):
+        stderr = StringIO()
+
+        call_command(
+            'set_menu_availability',
+            self.restaurant.id,
+            self.products[0].id,
+            '--unavailable',
+            stdout=StringIO(),
+            stderr=stderr
+        )
+
+        self.assertIn('CATALOG_CACHE_TIMEOUT', stderr.getvalue())
+        self.assertEqual(
+            RestaurantMenuItem.objects.filter(availability=False).count(),
+            1
+        )
+
+    def test_only_staff_can_switch_availability(self):
+        response = self.post_availability(self.products, False)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            RestaurantMenuItem.objects.filter(availability=True).count(),
+            len(self.products)
+        )
+
+
+class MenuIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_only_restaurants_with_every_product_are_capable(self):
+        products = create_products(4)
+        full, partial, other = [
+            create_restaurant(products[:3], name='Полное меню'),
+            create_restaurant(products[:2], name='Без третьего товара'),
+            create_restaurant(products[1:3], name='Без первого товара'),
+        ]
+        create_restaurant(name='Пустое меню')
+        index = MenuIndex.build()
+
+        for products_ids, restaurants_ids in [
+            ([products[1].id], {full.id, partial.id, other.id}),
+            ([products[0].id, products[1].id], {full.id, partial.id}),
+            ([products[1].id, products[2].id], {full.id, other.id}),
+            ([product.id for product in products[:3]], {full.id}),
+            ([products[0].id, products[2].id, products[0].id], {full.id}),
+            ([products[0].id, products[3].id], set()),
+        ]:
+            with self.subTest(products_ids=products_ids):
+                self.assertEqual(
+                    index.get_capable_restaurants_ids(products_ids),
+                    restaurants_ids
+                )
+
+        self.assertEqual(
+            index.get_capable_restaurants([products[1].id]),
+            [full, partial, other]
+        )
+
+    def test_moved_menu_item_leaves_its_old_product(self):
+        products = create_products(2)
+        restaurant = create_restaurant(products[:1])
+        get_menu_index()
+        menu_item = RestaurantMenuItem.objects.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            menu_item.product = products[1]
+            menu_item.save()
+            # Another worker caches the menu it still sees before the commit
+            cache.set(
+                get_menu_index_key(get_catalog_version()),
+                MenuIndex({restaurant: [products[0].id]})
+            )
+
+        self.assertEqual(
+            get_menu_index().get_available_products_ids(),
+            {products[1].id}
+        )
+
+
+class OrderTotalTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(3)
+        cls.admin = User.objects.create_superuser('admin')
+
+    def test_admin_inline_changes_update_total(self):
+        order = create_order(self.products[:2], total=100 + 101)
+        kept_item, deleted_item = order.items.order_by('id')
+        registered_at = timezone.localtime(order.registered_at)
+        self.client.force_login(self.admin)
+
+        response = self.client.post(
+            reverse('admin:foodcartapp_order_change', args=[order.id]),
+            {
+                'address': order.address,
+                'firstname': order.firstname,
+                'lastname': order.lastname,
+                'phonenumber': order.phonenumber,
+                'registered_at_0': registered_at.strftime('%Y-%m-%d'),
+                'registered_at_1': registered_at.strftime('%H:%M:%S'),
+                'pay_by': order.pay_by,
+                'status': order.status,
+                'items-TOTAL_FORMS': 3,
+                'items-INITIAL_FORMS': 2,
+                'items-0-id': kept_item.id,
+                'items-0-order': order.id,
+                'items-0-product': kept_item.product_id,
+                'items-0-price_at_order': kept_item.price_at_order,
+                'items-0-quantity': 3,
+                'items-1-id': deleted_item.id,
+                'items-1-order': order.id,
+                'items-1-product': deleted_item.product_id,
+                'items-1-price_at_order': deleted_item.price_at_order,
+                'items-1-quantity': 1,
+                'items-1-DELETE': 'on',
+                'items-2-order': order.id,
+                'items-2-product': self.products[2].id,
+                'items-2-price_at_order': 102,
+                'items-2-quantity': 2,
+            }
+        )
+
+        self.assertEqual(response.status_code, 302)
+        order.refresh_from_db()
+        self.assertEqual(order.total, 100 * 3 + 102 * 2)
+        self.assertEqual(
+            Order.objects.calculate_prices().get().price,
+            order.total
+        )
+
+    def test_check_reports_mismatched_totals(self):
+        order = create_order(self.products[:1], quantity=2, total=1)
+        create_order(self.products[:1], total=100)
+        stderr = StringIO()
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'recalculate_order_totals',
+                check=True,
+                stdout=StringIO(),
+                stderr=stderr
+            )
+
+        # Only the broken order is reported
+        mismatches = stderr.getvalue().splitlines()
+        self.assertEqual(len(mismatches), 1)
+        self.assertTrue(mismatches[0].startswith(f'Заказ {order.id}: '))
+        order.refresh_from_db()
+        self.assertEqual(order.total, 1)
+
+        call_command('recalculate_order_totals', stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.total, 200)
+
+
+class AdminSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Горячее')
+        for name in ['Чизбургер', 'Гамбургер', 'Cheeseburger']:
+            Product.objects.create(
+                name=name,
+                category=category,
+                price=100,
+                image='burger.jpg'
+            )
+        cls.admin = User.objects.create_superuser('admin')
+
+    def search_products(self, search_term):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:foodcartapp_product_changelist'),
+            {'q': search_term}
+        )
+        return {
+            product.name for product in response.context['cl'].result_list
+        }
+
+    def test_cyrillic_search_ignores_letter_case(self):
+        self.assertEqual(self.search_products('ЧИЗ'), {'Чизбургер'})
+        self.assertEqual(
+            self.search_products('бургер'),
+            {'Чизбургер', 'Гамбургер'}
+        )
+
+    def test_search_by_related_field(self):
+        self.assertEqual(len(self.search_products('гОРЯЧ')), 3)
+
+    def test_search_compiles_to_indexed_sql_on_postgresql(self):
+        # The query is only compiled, no PostgreSQL server is needed
+        postgresql = PostgreSQLDatabaseWrapper(
+            {**connection.settings_dict, 'ENGINE': 'django.db.backends.postgresql'},
+            alias='postgresql'
+        )
+        request = RequestFactory().get('/')
+        request.user = self.admin
+
+        for model, model_admin in admin.site._registry.items():
+            if not isinstance(model_admin, UnicodeSearchMixin):
+                continue
+            with self.subTest(model=model.__name__):
+                queryset, _ = model_admin.get_search_results(
+                    request,
+                    model.objects.all(),
+                    'Иван'
+                )
+                sql, params = (
+                    queryset.query
+                    .get_compiler(connection=postgresql)
+                    .as_sql()
+                )
+
+                self.assertIn('::text) LIKE UPPER(%s)', sql)
+                self.assertNotIn('CASEFOLD', sql)
+                self.assertIn('%Иван%', params)
+
+
+class ArchiveOrdersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product, = create_products(1)
+        cls.admin = User.objects.create_superuser('admin')
+
+    def create_order(self, status, days_ago):
+        return create_order(
+            [self.product],
+            quantity=2,
+            status=status,
+            registered_at=timezone.now() - timedelta(days=days_ago),
+            total=200
+        )
+
+    def test_only_old_finished_orders_are_archived(self):
+        old_order = self.create_order(Order.Status.COMPLETED, 40)
+        fresh_order = self.create_order(Order.Status.REJECTED, 1)
+        old_active_order = self.create_order(Order.Status.DELIVERY, 40)
+
+        OrderRegistration.objects.create(key='checkout-1', order=old_order)
+
+        call_command('archive_orders', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            set(Order.objects.values_list('id', flat=True)),
+            {fresh_order.id, old_active_order.id}
+        )
+        archived_order = ArchivedOrder.objects.get()
+        self.assertEqual(archived_order.id, old_order.id)
+        self.assertEqual(archived_order.total, 200)
+        self.assertEqual(
+            list(archived_order.items.values_list('product', 'quantity')),
+            [(self.product.id, 2)]
+        )
+        self.assertFalse(OrderItem.objects.filter(order=old_order.id).exists())
+        self.assertFalse(OrderRegistration.objects.exists())
+
+    @override_settings(ORDER_IDEMPOTENCY_KEY_TTL=60)
+    def test_expired_idempotency_keys_are_deleted(self):
+        fresh_order = self.create_order(Order.Status.DELIVERY, 0)
+        old_order = self.create_order(Order.Status.DELIVERY, 1)
+        for key, order in [('fresh', fresh_order), ('old', old_order)]:
+            OrderRegistration.objects.create(
+                key=key,
+                order=order,
+                registered_at=order.registered_at
+            )
+
+        call_command('archive_orders', stdout=StringIO())
+
+        self.assertEqual(
+            list(OrderRegistration.objects.values_list('key', flat=True)),
+            ['fresh']
+        )
+
+    def test_archived_orders_are_read_only_in_admin(self):
+        order = self.create_order(Order.Status.FAILED, 40)
+        call_command('archive_orders', stdout=StringIO())
+        self.client.force_login(self.admin)
+
+        change_url = reverse(
+            'admin:foodcartapp_archivedorder_change',
+            args=[order.id]
+        )
+        response = self.client.get(change_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['has_change_permission'])
+        self.assertEqual(
+            self.client.post(change_url, {'status': 'completed'}).status_code,
+            403
+        )
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_benchmark_flags_query_regressions(self):
+        call_command(
+            'seed_benchmark_data',
+            products=20,
+            restaurants=3,
+            orders=30,
+            batch_size=7,
+            stdout=StringIO()
+        )
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertFalse(
+            Order.objects.calculate_prices().exclude(total=F('price')).exists()
+        )
+
+        with TemporaryDirectory() as directory:
+            baseline_path = os.path.join(directory, 'baseline.json')
+            call_command(
+                'benchmark',
+                'register_order',
+                iterations=2,
+                warmup=1,
+                output=baseline_path,
+                stdout=StringIO(),
+                stderr=StringIO()
+            )
+            with open(baseline_path) as baseline_file:
+                baseline = json.load(baseline_file)
+            self.assertGreater(baseline['register_order']['queries'], 0)
+            self.assertEqual(Order.objects.count(), 30)
+
+            baseline['register_order']['queries'] -= 1
+            with open(baseline_path, 'w') as baseline_file:
+                json.dump(baseline, baseline_file)
+
+            with self.assertRaises(CommandError):
+                call_command(
+                    'benchmark',
+                    'register_order',
+                    iterations=2,
+                    warmup=1,
+                    compare=baseline_path,
+                    stdout=StringIO(),
+                    stderr=StringIO()
+                )
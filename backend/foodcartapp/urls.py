@@ -1,6 +1,11 @@
 from django.urls import path, include
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import (
+    product_list_api,
+    banners_list_api,
+    register_order,
+    set_menu_availability,
+)
 
 
 app_name = "foodcartapp"
@@ -9,5 +14,6 @@ urlpatterns = [
     path('products/', product_list_api),
     path('banners/', banners_list_api),
     path('order/', register_order),
+    path('menu/availability/', set_menu_availability),
     path('api-auth/', include('rest_framework.urls'))
 ]
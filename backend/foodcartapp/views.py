@@ -1,16 +1,49 @@
-from django.db import transaction
-from django.http import JsonResponse
+import hashlib
+import json
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import (
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse
+)
 from django.templatetags.static import static
-from rest_framework.decorators import api_view
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from rest_framework import serializers
+from rest_framework import serializers, status
+
+from addresses.services import enqueue_addresses
+from star_burger.metrics import query_budget, record_cache_lookup
 
-from .models import Product, OrderItem, Order
+from .catalog import get_catalog_version
+from .encoders import (
+    CONTENT_ENCODINGS,
+    JsonApiResponse,
+    choose_content_encoding,
+    compress,
+    get_json_format,
+    iter_compress,
+    iter_dumps
+)
+from .models import (
+    Product,
+    OrderItem,
+    Order,
+    OrderRegistration,
+    RestaurantMenuItem,
+)
 
 
 def banners_list_api(request):
     # FIXME move data to db?
-    return JsonResponse([
+    return JsonApiResponse([
         {
             'title': 'Burger',
             'src': static('burger.jpg'),
@@ -26,18 +59,12 @@ def banners_list_api(request):
             'src': static('tasty.jpg'),
             'text': 'Food is incomplete without a tasty dessert',
         }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
-
+    ])
 
-def product_list_api(request):
-    products = Product.objects.select_related('category').available()
 
-    dumped_products = []
+def serialize_products(products):
     for product in products:
-        dumped_product = {
+        yield {
             'id': product.id,
             'name': product.name,
             'price': product.price,
@@ -53,14 +80,84 @@ def product_list_api(request):
                 'name': product.name,
             }
         }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+
+
+def get_products_response_key(version):
+    return f'foodcartapp:products_response:{version}:{get_json_format()}'
+
+
+def iter_products_body(version, last_modified):
+    products = Product.objects.select_related('category').available()
+
+    chunks = []
+    for chunk in iter_dumps(serialize_products(products.iterator())):
+        chunks.append(chunk)
+        yield chunk
+
+    body = b''.join(chunks)
+    cache.set(
+        get_products_response_key(version),
+        {
+            'last_modified': last_modified,
+            'encodings': {
+                encoding: compress(body, encoding)
+                for encoding in CONTENT_ENCODINGS
+            }
+        },
+        timeout=settings.CATALOG_CACHE_TIMEOUT
+    )
+
+
+@query_budget(2)
+def product_list_api(request):
+    version = get_catalog_version()
+    encoding = choose_content_encoding(request)
+
+    etag = f'"products-{version}-{get_json_format()}-{encoding}"'
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        # The ETag differs per encoding, as does the body of a 200 response
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+    products_response = cache.get(get_products_response_key(version))
+    record_cache_lookup('products_response', products_response is not None)
+
+    if products_response is not None:
+        last_modified = products_response['last_modified']
+        response = HttpResponse(
+            products_response['encodings'][encoding],
+            content_type='application/json'
+        )
+    else:
+        last_modified = time.time()
+        body = iter_products_body(version, last_modified)
+        if settings.API_JSON_STREAMING:
+            response = StreamingHttpResponse(
+                iter_compress(body, encoding),
+                content_type='application/json'
+            )
+        else:
+            response = HttpResponse(
+                compress(b''.join(body), encoding),
+                content_type='application/json'
+            )
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ['Accept-Encoding'])
+
+    return response
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField()
+
     class Meta:
         model = OrderItem
         fields = ('product', 'quantity')
@@ -73,6 +170,30 @@ class OrderSerializer(serializers.ModelSerializer):
         write_only=True
     )
 
+    def validate_products(self, order_items_fields):
+        quantities = defaultdict(int)
+        for fields in order_items_fields:
+            quantities[fields['product']] += fields['quantity']
+
+        products = (
+            Product.objects
+            .available()
+            .only('id', 'price')
+            .in_bulk(quantities)
+        )
+
+        unknown_products_ids = quantities.keys() - products.keys()
+        if unknown_products_ids:
+            raise serializers.ValidationError(
+                'Недопустимые товары: '
+                f'{", ".join(map(str, sorted(unknown_products_ids)))}'
+            )
+
+        return [
+            {'product': products[product_id], 'quantity': quantity}
+            for product_id, quantity in quantities.items()
+        ]
+
     class Meta:
         model = Order
         fields = (
@@ -84,14 +205,7 @@ class OrderSerializer(serializers.ModelSerializer):
         )
 
 
-@api_view(['POST'])
-@transaction.atomic
-def register_order(request):
-    serializer = OrderSerializer(data=request.data)
-    serializer.is_valid(raise_exception=True)
-
-    order_description = serializer.validated_data
-
+def create_order(order_description):
     order_items_fields = order_description['products']
 
     for fields in order_items_fields:
@@ -101,7 +215,11 @@ def register_order(request):
         firstname=order_description['firstname'],
         lastname=order_description['lastname'],
         phonenumber=order_description['phonenumber'],
-        address=order_description['address']
+        address=order_description['address'],
+        total=sum(
+            fields['price_at_order'] * fields['quantity']
+            for fields in order_items_fields
+        )
     )
 
     OrderItem.objects.bulk_create([
@@ -109,4 +227,113 @@ def register_order(request):
         for fields in order_items_fields
     ])
 
-    return Response(OrderSerializer(order).data)
+    enqueue_addresses([order.address])
+
+    return order
+
+
+def get_request_hash(data):
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def replay_order_registration(registration, request_hash):
+    # Registrations made before request hashes were stored have none
+    if registration.request_hash not in ('', request_hash):
+        return Response(
+            {'Idempotency-Key': 'Ключ уже использован для другого заказа'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    return Response(
+        registration.response_data,
+        headers={'Idempotent-Replayed': 'true'}
+    )
+
+
+@query_budget(10)
+@api_view(['POST'])
+def register_order(request):
+    idempotency_key = request.headers.get('Idempotency-Key')
+
+    key_max_length = OrderRegistration._meta.get_field('key').max_length
+    if idempotency_key and len(idempotency_key) > key_max_length:
+        return Response(
+            {'Idempotency-Key': 'Слишком длинный ключ'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    request_hash = get_request_hash(request.data)
+
+    if idempotency_key:
+        registration = (
+            OrderRegistration.objects
+            .filter(key=idempotency_key)
+            .first()
+        )
+        if registration and registration.is_expired():
+            registration.delete()
+        elif registration:
+            return replay_order_registration(registration, request_hash)
+
+    try:
+        with transaction.atomic():
+            if idempotency_key:
+                # Claim the key before validating: a concurrent duplicate
+                # waits on the unique index and then replays our response.
+                registration = OrderRegistration.objects.create(
+                    key=idempotency_key,
+                    request_hash=request_hash
+                )
+
+            serializer = OrderSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+
+            order = create_order(serializer.validated_data)
+            response_data = OrderSerializer(order).data
+
+            if idempotency_key:
+                registration.order = order
+                registration.response_data = response_data
+                registration.save(update_fields=['order', 'response_data'])
+    except IntegrityError:
+        registration = idempotency_key and (
+            OrderRegistration.objects
+            .filter(key=idempotency_key)
+            .first()
+        )
+        if not registration:
+            raise
+        return replay_order_registration(registration, request_hash)
+
+    return Response(response_data)
+
+
+class MenuItemKeySerializer(serializers.Serializer):
+    restaurant = serializers.IntegerField()
+    product = serializers.IntegerField()
+
+
+class MenuAvailabilitySerializer(serializers.Serializer):
+    available = serializers.BooleanField()
+    menu_items = serializers.ListField(
+        child=MenuItemKeySerializer(),
+        allow_empty=False
+    )
+
+
+@query_budget(8)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def set_menu_availability(request):
+    serializer = MenuAvailabilitySerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    updated = RestaurantMenuItem.objects.set_availability(
+        [
+            (menu_item['restaurant'], menu_item['product'])
+            for menu_item in serializer.validated_data['menu_items']
+        ],
+        serializer.validated_data['available']
+    )
+
+    return Response({'updated': updated})
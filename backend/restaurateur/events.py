@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OrderEvent
+
+
+class EventsLost(Exception):
+    pass
+
+
+class InProcessEventBus:
+    def __init__(self, max_events=1000):
+        self.events = deque(maxlen=max_events)
+        self.last_event_id = 0
+        self.condition = threading.Condition()
+
+    def publish(self, payload):
+        with self.condition:
+            self.last_event_id += 1
+            self.events.append(
+                (self.last_event_id, payload, time.monotonic())
+            )
+            self.condition.notify_all()
+            return self.last_event_id
+
+    def get_cursor(self, max_age=0):
+        """Курсор, после которого придут и события последних max_age секунд."""
+        with self.condition:
+            published_before = time.monotonic() - max_age
+            cursor = self.last_event_id
+            for event_id, _, published_at in reversed(self.events):
+                if published_at <= published_before:
+                    break
+                cursor = event_id - 1
+            return cursor
+
+    def wait_for_events(self, cursor, timeout):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.last_event_id != cursor,
+                timeout=timeout
+            )
+
+            first_event_id = self.events[0][0] if self.events else 1
+            if cursor > self.last_event_id or cursor < first_event_id - 1:
+                raise EventsLost(f'Events after {cursor} are not available')
+
+            return [
+                (event_id, payload) for event_id, payload, _ in self.events
+                if event_id > cursor
+            ]
+
+
+class DatabaseEventBus:
+    """Раздаёт события через таблицу OrderEvent всем процессам сразу.
+
+    Подписчики опрашивают таблицу раз в ORDER_EVENTS_POLL_INTERVAL секунд,
+    курсор — это id последнего полученного события. События отдаются
+    строго по порядку id, без пропусков.
+    """
+
+    prune_every = 100
+
+    def __init__(self, max_events=1000):
+        self.max_events = max_events
+
+    def publish(self, payload):
+        event = OrderEvent.objects.create(order_id=payload)
+        # Old events are deleted in batches, not with every new one
+        if event.id % self.prune_every == 0:
+            OrderEvent.objects.filter(
+                id__lte=event.id - self.max_events
+            ).delete()
+        return event.id
+
+    def get_settled_before(self):
+        # Ids are taken at insert time, but concurrent publishes commit in
+        # any order: an event may show up after ones with greater ids.
+        # Missing ids below an event older than this are never coming.
+        return timezone.now() - timedelta(
+            seconds=settings.ORDER_EVENTS_SETTLE
+        )
+
+    def get_cursor(self, max_age=0):
+        """Курсор, после которого придут и события последних max_age секунд."""
+        published_before = min(
+            timezone.now() - timedelta(seconds=max_age),
+            self.get_settled_before()
+        )
+        ids = OrderEvent.objects.aggregate(
+            first=Min('id'),
+            last_old=Max('id', filter=Q(published_at__lte=published_before))
+        )
+        if ids['last_old'] is not None:
+            return ids['last_old']
+        return ids['first'] - 1 if ids['first'] else 0
+
+    def wait_for_events(self, cursor, timeout):
+        wait_until = time.monotonic() + timeout
+        while True:
+            ids = OrderEvent.objects.aggregate(first=Min('id'), last=Max('id'))
+            first_event_id = ids['first'] or 1
+            last_event_id = ids['last'] or 0
+            if cursor > last_event_id or cursor < first_event_id - 1:
+                raise EventsLost(f'Events after {cursor} are not available')
+
+            events = self.get_events_in_order(cursor)
+            if events:
+                return events
+
+            remaining = wait_until - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(settings.ORDER_EVENTS_POLL_INTERVAL, remaining))
+
+    def get_events_in_order(self, cursor):
+        settled_before = self.get_settled_before()
+
+        events = []
+        expected_id = cursor + 1
+        for event_id, order_id, published_at in (
+            OrderEvent.objects
+            .filter(id__gt=cursor)
+            .order_by('id')
+            .values_list('id', 'order_id', 'published_at')
+        ):
+            # Events after a gap wait until the missing ones are committed
+            if event_id != expected_id and published_at > settled_before:
+                break
+            events.append((event_id, order_id))
+            expected_id = event_id + 1
+        return events
+
+
+@lru_cache(maxsize=None)
+def get_event_bus():
+    return import_string(settings.ORDER_EVENTS_BUS)()
@@ -1,3 +1,18 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OrderEvent(models.Model):
+    order_id = models.IntegerField('ID заказа')
+    published_at = models.DateTimeField(
+        'когда опубликовано',
+        default=timezone.now,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'событие заказа'
+        verbose_name_plural = 'события заказов'
+
+    def __str__(self):
+        return f'{self.id}: заказ {self.order_id}'
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodcartapp.models import Order, OrderItem
+from foodcartapp.signals import order_events_suppressed
+
+from .events import get_event_bus
+
+
+def publish_order_change(order_id):
+    if order_events_suppressed.get():
+        return
+    transaction.on_commit(lambda: get_event_bus().publish(order_id))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def publish_order(sender, instance, **kwargs):
+    publish_order_change(instance.id)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def publish_order_item(sender, instance, **kwargs):
+    publish_order_change(instance.order_id)
@@ -1,3 +1,398 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import ResolverMatch
+from django.utils import timezone
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+
+from addresses.models import Address
+from foodcartapp.archive import archive_orders
+from foodcartapp.factories import (
+    create_order,
+    create_products,
+    create_restaurant,
+)
+from foodcartapp.models import (
+    Order,
+    Product,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from star_burger.metrics import (
+    MetricsMiddleware,
+    QueryBudgetExceeded,
+    query_budget,
+)
+from star_burger.replicas import (
+    STICKY_COOKIE,
+    ReplicaRouter,
+    read_from_replica,
+    replica_reads,
+    use_replica,
+)
+
+from .events import DatabaseEventBus, EventsLost, get_event_bus
+from .models import OrderEvent
+
+
+def parse_event(message):
+    fields = dict(
+        line.split(': ', 1) for line in message.strip().splitlines()
+    )
+    fields['data'] = json.loads(fields['data'])
+    return fields
+
+
+@override_settings(
+    ORDER_EVENTS_KEEPALIVE=0,
+    ORDER_EVENTS_SETTLE=0,
+    ORDER_EVENTS_STREAM_DURATION=1,
+    REPLICA_STICKINESS_SECONDS=0
+)
+class OrderEventsTest(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user('manager', is_staff=True)
+        self.client.force_login(manager)
+
+    def create_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_order()
+
+    def open_stream(self, cursor, **headers):
+        response = self.client.get(
+            '/manager/orders/events/',
+            {'cursor': cursor},
+            **headers
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return iter(response.streaming_content)
+
+    def test_dashboard_subscribes_from_current_cursor(self):
+        order = self.create_order()
+        # The cursor is read along with a menu index built from scratch
+        cache.clear()
+
+        response = self.client.get('/manager/orders/')
+
+        self.assertContains(response, f'id="order-{order.id}"')
+        self.assertContains(
+            response,
+            f'/manager/orders/events/?cursor={get_event_bus().get_cursor()}'
+        )
+
+    def test_changed_orders_are_pushed_as_rows(self):
+        stream = self.open_stream(get_event_bus().get_cursor())
+        order = self.create_order()
+
+        event = parse_event(next(stream).decode())
+
+        self.assertEqual(event['event'], 'order')
+        self.assertEqual(event['id'], str(get_event_bus().get_cursor()))
+        self.assertEqual(event['data']['id'], order.id)
+        self.assertIn(f'id="order-{order.id}"', event['data']['html'])
+
+    def test_reconnect_resumes_after_last_event(self):
+        first_order = self.create_order()
+        cursor = get_event_bus().get_cursor()
+        second_order = self.create_order()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first_order.status = Order.Status.COMPLETED
+            first_order.save()
+
+        stream = self.open_stream(0, HTTP_LAST_EVENT_ID=str(cursor))
+        events = [parse_event(next(stream).decode()) for _ in range(2)]
+
+        self.assertEqual(
+            [(event['event'], event['data']['id']) for event in events],
+            [('order', second_order.id), ('remove', first_order.id)]
+        )
+
+    def test_archived_orders_are_not_published(self):
+        order = self.create_order()
+        order.status = Order.Status.COMPLETED
+        order.save()
+        cursor = get_event_bus().get_cursor()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_orders(timezone.now() + timedelta(days=1), batch_size=10)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(get_event_bus().get_cursor(), cursor)
+
+    def test_unknown_cursor_asks_to_reload(self):
+        stream = self.open_stream(get_event_bus().get_cursor() + 100)
+
+        self.assertEqual(parse_event(next(stream).decode())['event'], 'reset')
+
+
+@override_settings(ORDER_EVENTS_POLL_INTERVAL=0, ORDER_EVENTS_SETTLE=0)
+class DatabaseEventBusTest(TestCase):
+    def test_events_are_shared_between_processes(self):
+        # Every process has its own bus object, only the database is shared
+        publisher, subscriber = DatabaseEventBus(), DatabaseEventBus()
+        cursor = subscriber.get_cursor()
+
+        event_id = publisher.publish(42)
+
+        self.assertEqual(
+            subscriber.wait_for_events(cursor, timeout=0),
+            [(event_id, 42)]
+        )
+        self.assertEqual(subscriber.get_cursor(), event_id)
+
+    def test_recent_events_are_replayed(self):
+        bus = DatabaseEventBus()
+        event_id = bus.publish(42)
+
+        self.assertEqual(bus.get_cursor(max_age=60), event_id - 1)
+
+    def test_pruned_events_are_lost(self):
+        bus = DatabaseEventBus(max_events=2)
+        bus.prune_every = 1
+        cursor = bus.get_cursor()
+        for order_id in range(3):
+            bus.publish(order_id)
+
+        with self.assertRaises(EventsLost):
+            bus.wait_for_events(cursor, timeout=0)
+
+    @override_settings(ORDER_EVENTS_SETTLE=60)
+    def test_events_committed_out_of_order_are_not_skipped(self):
+        bus = DatabaseEventBus()
+        first_event = OrderEvent.objects.create(order_id=1)
+        # The next id is taken by a publish that has not committed yet
+        late_id = first_event.id + 1
+        OrderEvent.objects.create(id=late_id + 1, order_id=3)
+
+        self.assertEqual(bus.get_cursor(), first_event.id - 1)
+        self.assertEqual(
+            bus.wait_for_events(first_event.id - 1, timeout=0),
+            [(first_event.id, 1)]
+        )
+        self.assertEqual(bus.wait_for_events(first_event.id, timeout=0), [])
+
+        OrderEvent.objects.create(id=late_id, order_id=2)
+
+        self.assertEqual(
+            bus.wait_for_events(first_event.id, timeout=0),
+            [(late_id, 2), (late_id + 1, 3)]
+        )
+
+    @override_settings(ORDER_EVENTS_SETTLE=60)
+    def test_settled_gaps_are_skipped(self):
+        bus = DatabaseEventBus()
+        first_event = OrderEvent.objects.create(
+            order_id=1,
+            published_at=timezone.now() - timedelta(minutes=2)
+        )
+        # The publish that took the id in between never committed
+        OrderEvent.objects.create(
+            id=first_event.id + 2,
+            order_id=3,
+            published_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        self.assertEqual(bus.get_cursor(), first_event.id + 2)
+        self.assertEqual(
+            bus.wait_for_events(first_event.id, timeout=0),
+            [(first_event.id + 2, 3)]
+        )
+
+
+@override_settings(PRODUCTS_PAGE_SIZE=2, PRODUCTS_RESTAURANTS_PAGE_SIZE=1)
+class ProductsViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(3)
+        cls.restaurants = [
+            create_restaurant(name='Star Burger 0'),
+            create_restaurant(cls.products[2:], name='Star Burger 1'),
+        ]
+        cls.manager = User.objects.create_user('manager', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def test_matrix_is_paginated_by_products_and_restaurants(self):
+        response = self.client.get(
+            '/manager/products/',
+            {'page': 2, 'restaurants_page': 2}
+        )
+        content = response.content.decode()
+
+        self.assertIn('Бургер 2', content)
+        self.assertNotIn('Бургер 0', content)
+        self.assertIn('Star Burger 1', content)
+        self.assertNotIn('Star Burger 0', content)
+        self.assertEqual(content.count('#3BB54A'), 1)
+
+    def test_matrix_is_cached_until_catalog_changes(self):
+        self.client.get('/manager/products/')
+
+        with self.assertNumQueries(2):
+            self.client.get('/manager/products/')
+
+        RestaurantMenuItem.objects.create(
+            restaurant=self.restaurants[0],
+            product=self.products[0]
+        )
+        response = self.client.get('/manager/products/')
+
+        self.assertEqual(response.content.decode().count('#3BB54A'), 1)
+
+
+@override_settings(ORDERS_PAGE_SIZE=2)
+class OrdersViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product, = create_products(1)
+        registered_at = timezone.now()
+        # Orders registered at the same moment are told apart by their id
+        cls.orders = [
+            create_order(
+                [product],
+                registered_at=registered_at - timedelta(minutes=1),
+                pay_by=Order.PayBy.CASH
+            ),
+            *[
+                create_order([product], registered_at=registered_at, pay_by=pay_by)
+                for pay_by in ['cash', 'card', 'cash', 'cash']
+            ],
+        ]
+        create_order(
+            [product],
+            registered_at=registered_at,
+            status=Order.Status.COMPLETED
+        )
+        cls.manager = User.objects.create_user('manager', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def walk_pages(self, query=''):
+        pages = []
+        while query is not None:
+            response = self.client.get(f'/manager/orders/?{query}')
+            self.assertEqual(response.status_code, 200)
+            pages.append([order['id'] for order in response.context['orders']])
+            query = response.context['next_page_query']
+        return pages
+
+    def test_pages_split_orders_registered_at_once(self):
+        orders_ids = [order.id for order in self.orders]
+
+        self.assertEqual(
+            self.walk_pages(),
+            [orders_ids[:2], orders_ids[2:4], orders_ids[4:]]
+        )
+
+    def test_filters_are_kept_on_next_pages(self):
+        cash_orders_ids = [
+            order.id for order in self.orders
+            if order.pay_by == Order.PayBy.CASH
+        ]
+
+        self.assertEqual(
+            self.walk_pages('pay_by=cash'),
+            [cash_orders_ids[:2], cash_orders_ids[2:]]
+        )
+
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.client.get('/manager/orders/', {'after': 'вчера'})
+
+        self.assertEqual(
+            [order['id'] for order in response.context['orders']],
+            [order.id for order in self.orders[:2]]
+        )
+
+
+class ReplicaRoutingTest(SimpleTestCase):
+    def call_view(self, request):
+        def view(request):
+            return HttpResponse(str(replica_reads.get()))
+
+        return read_from_replica(view)(request).content
+
+    def test_safe_requests_read_from_replica(self):
+        factory = RequestFactory()
+
+        self.assertEqual(self.call_view(factory.get('/')), b'True')
+        self.assertEqual(self.call_view(factory.post('/')), b'False')
+
+        factory.cookies[STICKY_COOKIE] = '1'
+        self.assertEqual(self.call_view(factory.get('/')), b'False')
+
+    @override_settings(REPLICA_DATABASE_ALIAS='default')
+    def test_only_replicated_apps_are_routed(self):
+        router = ReplicaRouter()
+
+        self.assertIsNone(router.db_for_read(Order))
+        with use_replica():
+            self.assertEqual(router.db_for_read(Order), 'default')
+            self.assertEqual(router.db_for_read(Address), 'default')
+            self.assertIsNone(router.db_for_read(User))
+
+
+class MetricsTest(TestCase):
+    def call_middleware(self, budget):
+        @query_budget(budget)
+        def view(request):
+            list(Product.objects.all())
+            list(Restaurant.objects.all())
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.user = User()
+        request.resolver_match = ResolverMatch(view, (), {}, 'test_view')
+        return MetricsMiddleware(view)(request)
+
+    def test_query_budget(self):
+        self.assertEqual(self.call_middleware(2).status_code, 200)
+
+        with self.assertRaises(QueryBudgetExceeded):
+            self.call_middleware(1)
+
+        with override_settings(QUERY_BUDGETS_RAISE=False):
+            with self.assertLogs('star_burger.metrics', 'WARNING') as logs:
+                self.call_middleware(1)
+        self.assertIn('test_view made 2 queries', logs.output[0])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_require_token(self):
+        self.client.get('/api/banners/')
+
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+        response = self.client.get(
+            '/metrics',
+            HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertContains(
+            response,
+            'starburger_requests_total{method="GET",status="200",'
+            'view="foodcartapp:foodcartapp.views.banners_list_api"}'
+        )
+
+    def test_profiler_is_for_staff_only(self):
+        manager = User.objects.create(username='manager', is_staff=True)
+        customer = Client()
+        customer.force_login(User.objects.create(username='customer'))
+        self.client.force_login(manager)
+
+        response = customer.get('/api/banners/', HTTP_X_PROFILE='1')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        response = self.client.get('/api/banners/', HTTP_X_PROFILE='1')
+        self.assertContains(response, 'pyinstrument')
@@ -1,15 +1,32 @@
-import geopy.distance
+import json
+import time
+from datetime import datetime
+
 from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
+from django.db.models import Q
 from rest_framework import serializers
 
+from addresses.distances import distance_matrix
 from addresses.models import Address
-from foodcartapp.models import Product, Restaurant, Order, RestaurantMenuItem
+from addresses.services import get_cached_coordinates
+from foodcartapp.catalog import get_catalog_version
+from foodcartapp.menu import get_menu_index
+from foodcartapp.models import Product, Restaurant, Order
+from star_burger.metrics import query_budget, record_cache_lookup
+from star_burger.replicas import get_replica_lag, read_from_replica
+
+from .events import EventsLost, get_event_bus
 
 
 class Login(forms.Form):
@@ -64,31 +81,96 @@ def is_manager(user):
     return user.is_staff  # FIXME replace with specific permission
 
 
+@query_budget(8)
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_products(request):
-    restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
-
-    default_availability = {restaurant.id: False for restaurant in restaurants}
-    products_with_restaurants = []
-    for product in products:
-        availability = {
-            **default_availability,
-            **{item.restaurant_id: item.availability for item in product.menu_items.all()},
-        }
-        orderer_availability = [availability[restaurant.id] for restaurant in restaurants]
+    products_page_number = get_page_number(request.GET.get('page'))
+    restaurants_page_number = get_page_number(
+        request.GET.get('restaurants_page')
+    )
 
-        products_with_restaurants.append(
-            (product, orderer_availability)
+    products_matrix_key = get_products_matrix_key(
+        get_catalog_version(),
+        products_page_number,
+        restaurants_page_number
+    )
+    products_matrix = cache.get(products_matrix_key)
+    record_cache_lookup('products_matrix', products_matrix is not None)
+
+    if products_matrix is None:
+        products_page, restaurants_page, products_matrix = (
+            render_products_matrix(
+                products_page_number,
+                restaurants_page_number
+            )
         )
+        # Out of range page numbers are rendered as the nearest page
+        # and are not cached
+        if (products_page.number, restaurants_page.number) == (
+            products_page_number,
+            restaurants_page_number
+        ):
+            cache.set(
+                products_matrix_key,
+                products_matrix,
+                timeout=settings.CATALOG_CACHE_TIMEOUT
+            )
 
     return render(request, template_name="products_list.html", context={
-        'products_with_restaurants': products_with_restaurants,
-        'restaurants': restaurants,
+        'products_matrix': products_matrix,
+    })
+
+
+def get_page_number(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def get_products_matrix_key(version, products_page, restaurants_page):
+    return (
+        f'restaurateur:products_matrix:{version}:'
+        f'{products_page}:{restaurants_page}'
+    )
+
+
+def render_products_matrix(products_page_number, restaurants_page_number):
+    menu_index = get_menu_index()
+
+    products_page = Paginator(
+        Product.objects.select_related('category').order_by('name', 'id'),
+        settings.PRODUCTS_PAGE_SIZE
+    ).get_page(products_page_number)
+    restaurants_page = Paginator(
+        Restaurant.objects.order_by('name', 'id'),
+        settings.PRODUCTS_RESTAURANTS_PAGE_SIZE
+    ).get_page(restaurants_page_number)
+
+    restaurants_products = [
+        menu_index.restaurant_products.get(restaurant.id, frozenset())
+        for restaurant in restaurants_page
+    ]
+    products_with_availability = [
+        (
+            product,
+            [product.id in products_ids for products_ids in restaurants_products]
+        )
+        for product in products_page
+    ]
+
+    products_matrix = render_to_string('products_matrix.html', context={
+        'products_with_availability': products_with_availability,
+        'products_page': products_page,
+        'restaurants_page': restaurants_page,
     })
 
+    return products_page, restaurants_page, products_matrix
+
 
+@query_budget(5)
 @user_passes_test(is_manager, login_url='restaurateur:login')
+@read_from_replica
 def view_restaurants(request):
     return render(request, template_name="restaurants_list.html", context={
         'restaurants': Restaurant.objects.all(),
@@ -102,13 +184,16 @@ class OrderSerializer(serializers.ModelSerializer):
     restaurants = serializers.SerializerMethodField()
 
     def get_price(self, order: Order):
-        return order.price
+        return order.total
 
     def get_restaurants(self, order: Order):
         addresses = self.context.get('addresses')
 
         order_coordinates = addresses.get(order.address)
 
+        if order_coordinates is None:
+            return ['Адрес заказа определяется']
+
         if order_coordinates == Address.NULL_COORDINATES:
             return ['Невозможный адрес заказа']
 
@@ -116,32 +201,37 @@ class OrderSerializer(serializers.ModelSerializer):
             order_item.product_id for order_item in order.items.all()
         ]
 
-        grouped_menu_items = self.context.get('grouped_menu_items')
+        menu_index = self.context.get('menu_index')
 
-        selected_restaurants = []
+        selected_restaurants = menu_index.get_capable_restaurants(products_ids)
 
-        for restaurant, menu_items in grouped_menu_items.items():
-            menu_products = [menu_item.product_id for menu_item in menu_items]
-            if all(products_ids) in menu_products:
-                selected_restaurants.append(restaurant)
+        distances = self.context.get('distances')
+        orders_indexes = self.context.get('orders_indexes')
+        restaurants_indexes = self.context.get('restaurants_indexes')
 
         formatted_restaurants = []
 
         for restaurant in selected_restaurants:
             restaurant_coordinates = addresses.get(restaurant.address)
+            if restaurant_coordinates is None:
+                formatted_restaurants.append(
+                    f'{restaurant.name}: адрес определяется'
+                )
+                continue
+
             if restaurant_coordinates == Address.NULL_COORDINATES:
                 formatted_restaurants.append(
                     f'{restaurant.name}: Невозможный адрес'
                 )
                 continue
 
-            restaurant_distance = geopy.distance.distance(
-                restaurant_coordinates,
-                order_coordinates
-            )
+            restaurant_distance = distances[
+                orders_indexes[order.id],
+                restaurants_indexes[restaurant.id]
+            ]
 
             formatted_restaurants.append(
-                f'{restaurant.name}: {round(restaurant_distance.km, 2)}км'
+                f'{restaurant.name}: {round(restaurant_distance, 2)}км'
             )
 
         return formatted_restaurants
@@ -162,54 +252,238 @@ class OrderSerializer(serializers.ModelSerializer):
         )
 
 
-@user_passes_test(is_manager, login_url='restaurateur:login')
-def view_orders(request):
-    unfinished_orders = (Order.objects
-                              .exclude(status__in=Order.FINISHED_STATUSES)
-                              .prefetch_related('items')
-                              .calculate_prices())
+class OrderFilter(forms.Form):
+    status = forms.ChoiceField(
+        label='Статус',
+        required=False,
+        choices=[('', 'Все')] + [
+            choice for choice in Order.Status.choices
+            if choice[0] not in Order.FINISHED_STATUSES
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    pay_by = forms.ChoiceField(
+        label='Способ оплаты',
+        required=False,
+        choices=[('', 'Все')] + Order.PayBy.choices,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    restaurant = forms.ModelChoiceField(
+        label='Ресторан',
+        required=False,
+        queryset=Restaurant.objects.order_by('name'),
+        empty_label='Все',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    after = forms.CharField(
+        required=False,
+        widget=forms.HiddenInput
+    )
+
+    def clean_after(self):
+        after = self.cleaned_data['after']
+        if not after:
+            return None
+
+        registered_at, _, order_id = after.rpartition('_')
+        try:
+            return datetime.fromisoformat(registered_at), int(order_id)
+        except ValueError:
+            raise forms.ValidationError('Неверная страница')
+
+    def filter(self, orders):
+        filters = {
+            field: self.cleaned_data[field]
+            for field in ('status', 'pay_by', 'restaurant')
+            if self.cleaned_data[field]
+        }
+        orders = orders.filter(**filters)
+
+        if self.cleaned_data['after']:
+            registered_at, order_id = self.cleaned_data['after']
+            orders = orders.filter(
+                Q(registered_at__gt=registered_at)
+                | Q(registered_at=registered_at, id__gt=order_id)
+            )
+
+        return orders
 
-    grouped_menu_items = RestaurantMenuItem.objects.group_by_restaurant()
 
-    restaurants = grouped_menu_items.keys()
+def get_orders_page_cursor(order):
+    return f'{order.registered_at.isoformat()}_{order.id}'
+
+
+def serialize_orders(orders):
+    menu_index = get_menu_index()
+
+    restaurants = menu_index.restaurants
 
     restaurants_addresses = [restaurant.address for restaurant in restaurants]
-    orders_addresses = [order.address for order in unfinished_orders]
+    orders_addresses = [order.address for order in orders]
 
-    existed_addresses = Address.objects.filter(
-        address__in=restaurants_addresses + orders_addresses
+    context_addresses = get_cached_coordinates(
+        restaurants_addresses + orders_addresses
     )
 
-    not_to_create = [
-        existed_address.address for existed_address in existed_addresses
-    ]
+    distances = distance_matrix(
+        [
+            context_addresses.get(address, Address.NULL_COORDINATES)
+            for address in orders_addresses
+        ],
+        [
+            context_addresses.get(address, Address.NULL_COORDINATES)
+            for address in restaurants_addresses
+        ],
+        precise=settings.PRECISE_DISTANCES
+    )
+
+    return OrderSerializer(
+        orders,
+        many=True,
+        context={
+            'menu_index': menu_index,
+            'addresses': context_addresses,
+            'distances': distances,
+            'orders_indexes': {
+                order.id: index
+                for index, order in enumerate(orders)
+            },
+            'restaurants_indexes': {
+                restaurant.id: index
+                for index, restaurant in enumerate(restaurants)
+            }
+        }
+    ).data
+
+
+@query_budget(9)
+@user_passes_test(is_manager, login_url='restaurateur:login')
+@read_from_replica
+def view_orders(request):
+    # Orders committed shortly before may not have reached the replica yet,
+    # so their events are streamed again
+    events_cursor = get_event_bus().get_cursor(max_age=get_replica_lag())
+
+    unfinished_orders = (
+        Order.objects
+        .exclude(status__in=Order.FINISHED_STATUSES)
+        .order_by('registered_at', 'id')
+    )
+
+    order_filter = OrderFilter(request.GET)
+    if order_filter.is_valid():
+        unfinished_orders = order_filter.filter(unfinished_orders)
+
+    page_size = settings.ORDERS_PAGE_SIZE
+    orders = list(
+        unfinished_orders.prefetch_related('items')[:page_size + 1]
+    )
+
+    next_page_query = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        next_page_query = request.GET.copy()
+        next_page_query['after'] = get_orders_page_cursor(orders[-1])
+        next_page_query = next_page_query.urlencode()
+
+    first_page_query = request.GET.copy()
+    first_page_query.pop('after', None)
+
+    events_query = first_page_query.copy()
+    events_query['cursor'] = events_cursor
+
+    return render(request, template_name='order_items.html', context={
+        'orders': serialize_orders(orders),
+        'order_filter': order_filter,
+        'next_page_query': next_page_query,
+        'first_page_query': first_page_query.urlencode(),
+        'is_first_page': 'after' not in request.GET,
+        'events_query': events_query.urlencode(),
+        'next_url': request.get_full_path(),
+    })
+
+
+def format_order_event(event, data, event_id=None):
+    message = f'event: {event}\ndata: {json.dumps(data)}\n\n'
+    if event_id is not None:
+        message = f'id: {event_id}\n{message}'
+    return message
 
-    addresses_to_create = [
-        Address(address=address)
-        for address in set(restaurants_addresses + orders_addresses)
-        if address not in not_to_create
+
+def iter_order_events(orders_ids, order_filter, event_id):
+    orders = (
+        Order.objects
+        .filter(id__in=orders_ids)
+        .exclude(status__in=Order.FINISHED_STATUSES)
+        .order_by('registered_at', 'id')
+    )
+    if order_filter.is_valid():
+        orders = order_filter.filter(orders)
+
+    orders = list(orders.prefetch_related('items'))
+
+    events = [
+        ('order', {
+            'id': order['id'],
+            'html': render_to_string('order_row.html', {
+                'order': order,
+                'next_url': reverse('restaurateur:view_orders'),
+            }),
+        })
+        for order in serialize_orders(orders)
     ]
+    events += [
+        ('remove', {'id': order_id})
+        for order_id in orders_ids - {order.id for order in orders}
+    ]
+
+    for number, (event, data) in enumerate(events, start=1):
+        yield format_order_event(
+            event,
+            data,
+            event_id if number == len(events) else None
+        )
+
+
+def stream_order_events(cursor, order_filter):
+    event_bus = get_event_bus()
+    stream_until = time.monotonic() + settings.ORDER_EVENTS_STREAM_DURATION
 
-    for address in addresses_to_create:
+    while time.monotonic() < stream_until:
         try:
-            address.update_coordinates(save=False)
-        except ValueError:
+            events = event_bus.wait_for_events(
+                cursor,
+                timeout=settings.ORDER_EVENTS_KEEPALIVE
+            )
+        except EventsLost:
+            yield format_order_event('reset', {})
+            return
+
+        if not events:
+            yield ': keepalive\n\n'
             continue
 
-    created_addresses = Address.objects.bulk_create(addresses_to_create)
+        cursor = events[-1][0]
+        orders_ids = {order_id for _, order_id in events}
 
-    context_addresses = {
-        address.address: address.coordinates
-        for address in list(existed_addresses) + list(created_addresses)
-    }
+        yield from iter_order_events(orders_ids, order_filter, cursor)
 
-    return render(request, template_name='order_items.html', context={
-        'orders': OrderSerializer(
-            unfinished_orders,
-            many=True,
-            context={
-                'grouped_menu_items': grouped_menu_items,
-                'addresses': context_addresses
-            }
-        ).data
-    })
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_order_events(request):
+    cursor = request.headers.get('Last-Event-ID', request.GET.get('cursor'))
+    try:
+        cursor = int(cursor)
+    except (TypeError, ValueError):
+        cursor = get_event_bus().get_cursor()
+
+    order_filter = OrderFilter(request.GET)
+
+    response = StreamingHttpResponse(
+        stream_order_events(cursor, order_filter),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+
+    return response
@@ -0,0 +1,184 @@
+import logging
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pyinstrument import Profiler
+
+
+logger = logging.getLogger(__name__)
+
+REQUESTS = Counter(
+    'starburger_requests_total',
+    'HTTP requests',
+    ['view', 'method', 'status']
+)
+REQUEST_DURATION = Histogram(
+    'starburger_request_duration_seconds',
+    'Time to produce a response, without streaming the body',
+    ['view']
+)
+REQUEST_DB_QUERIES = Histogram(
+    'starburger_request_db_queries',
+    'Database queries per request',
+    ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200)
+)
+REQUEST_DB_DURATION = Histogram(
+    'starburger_request_db_duration_seconds',
+    'Time spent in database queries per request',
+    ['view']
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    'starburger_query_budget_exceeded_total',
+    'Requests that made more database queries than their view allows',
+    ['view']
+)
+CACHE_LOOKUPS = Counter(
+    'starburger_cache_lookups_total',
+    'Lookups of cached data',
+    ['cache', 'result']
+)
+GEOCODER_REQUESTS = Histogram(
+    'starburger_geocoder_request_duration_seconds',
+    'Geocoder lookups',
+    ['backend', 'result']
+)
+GEOCODER_REJECTED = Counter(
+    'starburger_geocoder_rejected_total',
+    'Geocoder requests skipped while the geocoder is considered unavailable',
+    ['backend', 'reason']
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """Сколько запросов к базе может сделать вьюха за один HTTP-запрос."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def record_cache_lookup(cache_name, hit, count=1):
+    CACHE_LOOKUPS.labels(cache_name, 'hit' if hit else 'miss').inc(count)
+
+
+def get_view_name(request):
+    # Unnamed urls get the dotted path of the view as their view_name
+    match = request.resolver_match
+    return match.view_name if match else '<unmatched>'
+
+
+class QueriesRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started_at
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.should_profile(request):
+            return self.profile(request)
+
+        # Queries made while a streaming body is sent are not counted
+        queries = QueriesRecorder()
+        started_at = time.perf_counter()
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+
+        view_name = get_view_name(request)
+        REQUESTS.labels(view_name, request.method, response.status_code).inc()
+        REQUEST_DURATION.labels(view_name).observe(
+            time.perf_counter() - started_at
+        )
+        REQUEST_DB_QUERIES.labels(view_name).observe(queries.count)
+        REQUEST_DB_DURATION.labels(view_name).observe(queries.duration)
+
+        self.check_query_budget(request, view_name, queries.count)
+
+        return response
+
+    def check_query_budget(self, request, view_name, queries_count):
+        match = request.resolver_match
+        budget = match and getattr(match.func, 'query_budget', None)
+        if budget is None or queries_count <= budget:
+            return
+
+        QUERY_BUDGET_EXCEEDED.labels(view_name).inc()
+        message = (
+            f'{view_name} made {queries_count} queries '
+            f'with a budget of {budget}'
+        )
+        if settings.QUERY_BUDGETS_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+    def should_profile(self, request):
+        return (
+            settings.PROFILER_HEADER in request.headers
+            and request.user.is_staff
+        )
+
+    def profile(self, request):
+        profiler = Profiler(interval=settings.PROFILER_INTERVAL)
+        profiler.start()
+        response = self.get_response(request)
+        # Streaming responses do their work only while the body is consumed
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        profiler.stop()
+
+        return HttpResponse(profiler.output_html())
+
+
+def get_metrics_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not token or not constant_time_compare(authorization, f'Bearer {token}'):
+        raise Http404
+
+    return HttpResponse(
+        generate_latest(get_metrics_registry()),
+        content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_COOKIE = 'read_from_primary'
+
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+def get_replica_alias():
+    alias = settings.REPLICA_DATABASE_ALIAS
+    return alias if alias in connections.databases else None
+
+
+def get_replica_lag():
+    """Насколько данные, которые сейчас читаются, могут отставать, в секундах."""
+    if replica_reads.get() and get_replica_alias():
+        return settings.REPLICA_STICKINESS_SECONDS
+    return 0
+
+
+@contextmanager
+def use_replica():
+    token = replica_reads.set(True)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def read_from_replica(view):
+    """Выполняет безопасные запросы к вьюхе на чтение с реплики.
+
+    Клиенты, которые только что что-то меняли, читают с основной базы,
+    пока у них есть кука STICKY_COOKIE.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+
+        with use_replica():
+            response = view(request, *args, **kwargs)
+            # Lazy responses of admin views query the database while rendering
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            return response
+
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS and get_replica_alias():
+            # Replication lags behind, so for a while after a write the
+            # client keeps reading its own changes from the primary
+            response.set_cookie(
+                STICKY_COOKIE,
+                '1',
+                max_age=settings.REPLICA_STICKINESS_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+
+        return response
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not replica_reads.get():
+            return None
+        if model._meta.app_label not in settings.REPLICA_APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return get_replica_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
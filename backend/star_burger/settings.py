@@ -16,6 +16,51 @@ SECRET_KEY = env('SECRET_KEY')
 DEBUG = env.bool('DEBUG', True)
 
 YANDEX_GEOCODER_API_KEY = env('YANDEX_GEOCODER_API_KEY')
+GEOCODER_URL = env.str('GEOCODER_URL', 'https://geocode-maps.yandex.ru/1.x')
+GEOCODER_BACKENDS = env.list(
+    'GEOCODER_BACKENDS',
+    ['addresses.geocoder.YandexGeocoder']
+)
+GEOCODER_GAZETTEER = env.str('GEOCODER_GAZETTEER', '')
+GEOCODER_GAZETTEER_MIN_SIMILARITY = env.float(
+    'GEOCODER_GAZETTEER_MIN_SIMILARITY',
+    0.8
+)
+NOMINATIM_URL = env.str('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+NOMINATIM_USER_AGENT = env.str('NOMINATIM_USER_AGENT', 'star-burger')
+GEOCODER_CONNECT_TIMEOUT = env.float('GEOCODER_CONNECT_TIMEOUT', 3.05)
+GEOCODER_READ_TIMEOUT = env.float('GEOCODER_READ_TIMEOUT', 5)
+GEOCODER_BREAKER_FAILURES = env.int('GEOCODER_BREAKER_FAILURES', 5)
+GEOCODER_BREAKER_RESET = env.int('GEOCODER_BREAKER_RESET', 30)
+GEOCODER_WORKERS = env.int('GEOCODER_WORKERS', 8)
+GEOCODER_MAX_ATTEMPTS = env.int('GEOCODER_MAX_ATTEMPTS', 5)
+GEOCODER_RETRY_DELAY = env.int('GEOCODER_RETRY_DELAY', 60)
+GEOCODER_TASK_LEASE = env.int('GEOCODER_TASK_LEASE', 300)
+GEOCODER_METRICS_PORT = env.int('GEOCODER_METRICS_PORT', 0)
+GEOCODER_COORDINATES_TTL = env.int('GEOCODER_COORDINATES_TTL', 60 * 60 * 24 * 30)
+GEOCODER_BAD_ADDRESS_TTL = env.int('GEOCODER_BAD_ADDRESS_TTL', 60 * 60 * 24)
+GEOCODER_TTL_JITTER = env.float('GEOCODER_TTL_JITTER', 0.1)
+
+PRECISE_DISTANCES = env.bool('PRECISE_DISTANCES', False)
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', 50)
+ORDERS_ARCHIVE_AFTER_DAYS = env.int('ORDERS_ARCHIVE_AFTER_DAYS', 30)
+ORDER_IDEMPOTENCY_KEY_TTL = env.int('ORDER_IDEMPOTENCY_KEY_TTL', 60 * 60 * 24)
+PRODUCTS_PAGE_SIZE = env.int('PRODUCTS_PAGE_SIZE', 50)
+PRODUCTS_RESTAURANTS_PAGE_SIZE = env.int('PRODUCTS_RESTAURANTS_PAGE_SIZE', 20)
+
+ORDER_EVENTS_BUS = env.str(
+    'ORDER_EVENTS_BUS',
+    'restaurateur.events.DatabaseEventBus'
+)
+ORDER_EVENTS_POLL_INTERVAL = env.float('ORDER_EVENTS_POLL_INTERVAL', 1)
+ORDER_EVENTS_SETTLE = env.float('ORDER_EVENTS_SETTLE', 5)
+ORDER_EVENTS_KEEPALIVE = env.int('ORDER_EVENTS_KEEPALIVE', 15)
+ORDER_EVENTS_STREAM_DURATION = env.int('ORDER_EVENTS_STREAM_DURATION', 60)
+
+METRICS_TOKEN = env.str('METRICS_TOKEN', '')
+QUERY_BUDGETS_RAISE = env.bool('QUERY_BUDGETS_RAISE', False)
+PROFILER_HEADER = env.str('PROFILER_HEADER', 'X-Profile')
+PROFILER_INTERVAL = env.float('PROFILER_INTERVAL', 0.001)
 
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', ['127.0.0.1', 'localhost'])
 
@@ -40,6 +85,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'star_burger.replicas.ReplicaStickinessMiddleware',
+    'star_burger.metrics.MetricsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -48,6 +95,8 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'star_burger.urls'
 
+TEST_RUNNER = 'star_burger.test_runner.QueryBudgetsTestRunner'
+
 DEBUG_TOOLBAR_PANELS = [
     'debug_toolbar.panels.versions.VersionsPanel',
     'debug_toolbar.panels.timer.TimerPanel',
@@ -92,6 +141,27 @@ DATABASES = {
     )
 }
 
+REPLICA_DATABASE_ALIAS = env.str('REPLICA_DATABASE_ALIAS', 'replica')
+if env.str('REPLICA_DATABASE', ''):
+    DATABASES[REPLICA_DATABASE_ALIAS] = {
+        **env.dj_db_url('REPLICA_DATABASE'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['star_burger.replicas.ReplicaRouter']
+REPLICA_APPS = ['foodcartapp', 'addresses']
+REPLICA_STICKINESS_SECONDS = env.int('REPLICA_STICKINESS_SECONDS', 10)
+
+CACHES = {
+    'default': env.dj_cache_url('CACHE', 'locmem://')
+}
+
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', 60 * 60 * 24)
+
+API_JSON_PRETTY = env.bool('API_JSON_PRETTY', False)
+API_JSON_STREAMING = env.bool('API_JSON_STREAMING', True)
+API_JSON_CHUNK_SIZE = env.int('API_JSON_CHUNK_SIZE', 100)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,17 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryBudgetsTestRunner(DiscoverRunner):
+    """В тестах вьюха, превысившая бюджет запросов к базе, падает с ошибкой."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.query_budgets_settings = override_settings(
+            QUERY_BUDGETS_RAISE=True
+        )
+        self.query_budgets_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.query_budgets_settings.disable()
+        super().teardown_test_environment(**kwargs)
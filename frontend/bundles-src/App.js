@@ -13,6 +13,13 @@ import NoResults from "./components/NoResults";
 
 import './css/App.css';
 
+function generateCheckoutKey(){
+  if (window.crypto && window.crypto.randomUUID){
+    return window.crypto.randomUUID();
+  }
+  return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
 class App extends Component {
 
   constructor(props){
@@ -25,6 +32,8 @@ class App extends Component {
       quickViewProduct: null,  // will be replaced by selected product attributes
       showCart: false,
       checkoutModalActive: false,
+      checkoutKey: null,  // sent as Idempotency-Key so retries of one checkout don't create duplicate orders
+      checkoutBody: null,  // request the key was made for, any change to the order needs a new key
     };
     this.handleSearch = this.handleSearch.bind(this);
     this.handleAddToCart = this.handleAddToCart.bind(this);
@@ -60,6 +69,13 @@ class App extends Component {
       address
     };
 
+    let body = JSON.stringify(data);
+    let checkoutKey = this.state.checkoutKey;
+    if (!checkoutKey || body !== this.state.checkoutBody){
+      checkoutKey = generateCheckoutKey();
+      this.setState({checkoutKey, checkoutBody: body});
+    }
+
     let csrfToken = document.querySelector("[name=csrfmiddlewaretoken]").value;
 
     try {
@@ -69,8 +85,9 @@ class App extends Component {
           'Accept': 'application/json',
           'Content-Type': 'application/json',
           'X-CSRFToken': csrfToken,
+          'Idempotency-Key': checkoutKey,
         },
-        body: JSON.stringify(data),
+        body,
       });
 
       if (!response.ok){
@@ -81,6 +98,8 @@ class App extends Component {
 
       this.setState({
         cart: [],
+        checkoutKey: null,
+        checkoutBody: null,
       });
 
       alert("Заказ оформлен. Вам перезвонят в течение 10 минут.");